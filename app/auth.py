@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Awaitable, Callable, Literal
 
@@ -7,21 +9,66 @@ from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
-from app.config import ALGORITHM, SECRET_KEY
+from app.config import (
+    ALGORITHM,
+    ARGON2_MEMORY_COST,
+    ARGON2_TIME_COST,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_SCHEME,
+    PASSWORD_HASH_WORKERS,
+    SECRET_KEY,
+)
 from app.db_depends import get_async_db
 from app.models.users import User as UserModel
+from app.principals import Principal, principal_cache
+from app.refresh_tokens import REFRESH_TOKEN_EXPIRE_DAYS, revoked_families
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+PASSWORD_HASH_SCHEMES = ('bcrypt', 'argon2')
+
+
+def create_password_context(
+        scheme: str = PASSWORD_HASH_SCHEME,
+        bcrypt_rounds: int = BCRYPT_ROUNDS,
+        argon2_time_cost: int = ARGON2_TIME_COST,
+        argon2_memory_cost: int = ARGON2_MEMORY_COST,
+) -> CryptContext:
+    """Контекст хеширования с заданным алгоритмом и стоимостью.
+
+    Второй алгоритм остаётся только для проверки старых хешей и
+    помечен устаревшим, как и хеши с меньшей стоимостью.
+    """
+    if scheme not in PASSWORD_HASH_SCHEMES:
+        raise ValueError(f'Unknown PASSWORD_HASH_SCHEME: {scheme}')
+    return CryptContext(
+        schemes=[scheme, *(other for other in PASSWORD_HASH_SCHEMES
+                           if other != scheme)],
+        deprecated='auto',
+        bcrypt__rounds=bcrypt_rounds,
+        argon2__time_cost=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        # Параллелизм даёт пул потоков, один хеш — одно ядро.
+        argon2__parallelism=1,
+    )
+
+
+pwd_context = create_password_context()
+# Хеширование отпускает GIL, поэтому потоки дают настоящий параллелизм,
+# а размер пула ограничивает одновременную нагрузку на CPU.
+password_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash'
+)
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-REFRESH_TOKEN_EXPIRE_DAYS = 7
+GUEST_CART_EXPIRE_DAYS = 30
+GUEST_CART_MAX_ITEMS = 100
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='users/token')
 
 
 def hash_password(password: str) -> str:
-    """Преобразует пароль в хеш с использованием bcrypt."""
+    """Преобразует пароль в хеш настроенным алгоритмом."""
     return pwd_context.hash(password)
 
 
@@ -30,6 +77,42 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(
+        plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Проверяет пароль и, если хеш устарел, возвращает новый."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    """Хеширует пароль в пуле потоков, не блокируя event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_hash_executor, hash_password, password
+    )
+
+
+async def verify_password_async(plain_password: str,
+                                hashed_password: str) -> bool:
+    """Проверяет пароль в пуле потоков, не блокируя event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_hash_executor, verify_password,
+        plain_password, hashed_password,
+    )
+
+
+async def verify_and_update_password_async(
+        plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """verify_and_update_password в пуле потоков."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_hash_executor, verify_and_update_password,
+        plain_password, hashed_password,
+    )
+
+
 def create_access_token(data: dict) -> str:
     """Создаёт JWT с payload (sub, role, id, exp)."""
     to_encode = data.copy()
@@ -43,7 +126,7 @@ def create_access_token(data: dict) -> str:
 
 
 def create_refresh_token(data: dict) -> str:
-    """Создаёт refresh-токен."""
+    """Создаёт refresh-токен; data должен содержать fam и jti."""
     to_encode = data.copy()
     expire = (datetime.now(timezone.utc) + timedelta(
         days=REFRESH_TOKEN_EXPIRE_DAYS))
@@ -54,11 +137,70 @@ def create_refresh_token(data: dict) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def create_guest_cart_token(items: dict[int, int]) -> str:
+    """Создаёт подписанный токен гостевой корзины (product_id -> quantity)."""
+    expire = (datetime.now(timezone.utc) + timedelta(
+        days=GUEST_CART_EXPIRE_DAYS))
+    to_encode = {
+        'items': [[product_id, quantity]
+                  for product_id, quantity in items.items()],
+        'exp': expire,
+        'token_type': 'guest_cart',
+    }
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_guest_cart_token(token: str | None) -> dict[int, int]:
+    """Возвращает содержимое гостевой корзины из токена.
+
+    Отсутствующий или просроченный токен означает пустую корзину.
+    """
+    if not token:
+        return {}
+    invalid_token_exception = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail='Invalid guest cart token',
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        return {}
+    except jwt.PyJWTError:
+        raise invalid_token_exception
+    if payload.get('token_type') != 'guest_cart':
+        raise invalid_token_exception
+    try:
+        return {int(product_id): int(quantity)
+                for product_id, quantity in payload.get('items', [])}
+    except (TypeError, ValueError):
+        raise invalid_token_exception
+
+
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
-        db: AsyncSession = Depends(get_async_db)
+        db: AsyncSession = Depends(get_async_db, scope='function')
 ) -> UserModel:
-    """Проверяет JWT и возвращает пользователя из базы."""
+    """Проверяет JWT и возвращает пользователя из кэша или базы."""
+    return await get_user_by_token(token, db)
+
+
+def _cached_user(principal: Principal) -> UserModel:
+    """Пользователь из кэша: отсоединён от сессии, пароль не загружен."""
+    user = UserModel(id=principal.id, email=principal.email,
+                     role=principal.role, is_active=True)
+    make_transient_to_detached(user)
+    return user
+
+
+async def get_user_by_token(token: str, db: AsyncSession) -> UserModel:
+    """Возвращает активного пользователя по access-токену или 401.
+
+    Используется там, где токен приходит не через заголовок
+    Authorization, например при подключении по WebSocket. Активные
+    пользователи кэшируются по id из токена, так что обычный запрос
+    обходится без обращения к базе. Токены отозванного семейства
+    (fam) отклоняются по множеству в памяти.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail='Could not validate credentials',
@@ -67,7 +209,8 @@ async def get_current_user(
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get('sub')
-        if email is None:
+        # Refresh- и прочие токены той же подписью не авторизуют запросы.
+        if email is None or payload.get('token_type') != 'access':
             raise credentials_exception
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -77,19 +220,50 @@ async def get_current_user(
         )
     except jwt.PyJWTError:
         raise credentials_exception
+    if payload.get('fam') in revoked_families:
+        raise credentials_exception
+
+    user_id = payload.get('id')
+    if isinstance(user_id, int):
+        principal = principal_cache.get(user_id)
+        if principal is not None and principal.email == email:
+            return _cached_user(principal)
+
+    generation = principal_cache.generation
     result = await db.scalars(
         select(UserModel).where(UserModel.email == email,
                                 UserModel.is_active))
     user = result.first()
     if user is None:
         raise credentials_exception
+    principal_cache.put(Principal(user.id, user.email, user.role), generation)
     return user
 
 
+async def get_active_principal(db: AsyncSession,
+                               user_id: int) -> Principal | None:
+    """Активный пользователь по id: из кэша или, при промахе, из базы."""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    generation = principal_cache.generation
+    user = await db.scalar(
+        select(UserModel).where(UserModel.id == user_id, UserModel.is_active)
+    )
+    if user is None:
+        return None
+    principal = Principal(user.id, user.email, user.role)
+    principal_cache.put(principal, generation)
+    return principal
+
+
 def require_role(
         required_role: Literal['seller', 'buyer', 'admin']
 )-> Callable[[UserModel], Awaitable[UserModel]]:
-    """Фабрика dependency для проверки роли пользователя."""
+    """Фабрика dependency для проверки роли пользователя.
+
+    Роль берётся из кэшированного пользователя get_current_user.
+    """
     async def role_checker(
             current_user: UserModel = Depends(get_current_user),
     ) -> UserModel:
@@ -0,0 +1,135 @@
+"""Пропускная способность каталога и время удержания соединений.
+
+Запуск:
+    python -m app.catalog_benchmark
+    python -m app.catalog_benchmark --path /categories/ --clients 50
+    DB_PGBOUNCER=true python -m app.catalog_benchmark --with-proxy
+
+Поднимает приложение на uvicorn в этом процессе; --clients клиентов
+--seconds секунд подряд запрашивают --path. Печатает запросы в
+секунду, p50 и p99 задержки, сколько миллисекунд запрос в среднем
+держит соединение из пула и сколько новых соединений с базой
+открывается на запрос. С --with-proxy перед DATABASE_URL поднимается
+TransactionPoolingProxy из app.pgbouncer_check, ведущий в
+DATABASE_DIRECT_URL.
+"""
+import argparse
+import asyncio
+import time
+
+import uvicorn
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from app.database import async_engine, async_read_engine
+from app.login_benchmark import BENCHMARK_HOST, http_request, percentile
+from app.main import app
+from app.pgbouncer_check import DEFAULT_BACKENDS, TransactionPoolingProxy
+from app.settings import settings
+
+DEFAULT_CLIENTS = 20
+DEFAULT_SECONDS = 10
+DEFAULT_PORT = 8767
+
+
+class _ConnectionUsage:
+    """Считает выдачи соединений из пула и суммарное время удержания."""
+
+    def __init__(self) -> None:
+        self.connects = 0
+        self.held_seconds = 0.0
+        self._checked_out: dict[int, float] = {}
+
+    def listen(self, engine) -> None:
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+
+    def reset(self) -> None:
+        self.connects = 0
+        self.held_seconds = 0.0
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record,
+                     connection_proxy) -> None:
+        self._checked_out[id(connection_record)] = time.perf_counter()
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        started = self._checked_out.pop(id(connection_record), None)
+        if started is not None:
+            self.held_seconds += time.perf_counter() - started
+
+
+async def run_benchmark(path: str, clients: int, seconds: float, port: int,
+                        with_proxy: bool) -> None:
+    """Нагружает маршрут и печатает задержки и расход соединений."""
+    usage = _ConnectionUsage()
+    for engine in {async_engine, async_read_engine}:
+        usage.listen(engine.sync_engine)
+
+    proxy = None
+    if with_proxy:
+        proxy = TransactionPoolingProxy(
+            make_url(settings.database_direct_url), DEFAULT_BACKENDS
+        )
+        await proxy.start(make_url(settings.database_url).port)
+
+    server = uvicorn.Server(uvicorn.Config(
+        app, host=BENCHMARK_HOST, port=port, log_level='warning'
+    ))
+    serving = asyncio.create_task(server.serve())
+    latencies: list[float] = []
+    statuses: list[int] = []
+    try:
+        while not server.started:
+            await asyncio.sleep(0.05)
+        await http_request(port, 'GET', path)
+        usage.reset()
+        deadline = time.perf_counter() + seconds
+
+        async def client() -> None:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                statuses.append(await http_request(port, 'GET', path))
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        await serving
+        if proxy is not None:
+            await proxy.close()
+
+    latencies.sort()
+    requests = len(latencies)
+    print(f'GET {path}: {requests} requests, '
+          f'{statuses.count(200)} ok, {requests / elapsed:.0f} req/s')
+    print(f'latency p50={percentile(latencies, 0.5) * 1000:.1f}ms '
+          f'p99={percentile(latencies, 0.99) * 1000:.1f}ms')
+    print(f'connection held {usage.held_seconds / requests * 1000:.2f}ms '
+          f'per request, {usage.connects / requests:.2f} new connections '
+          f'per request')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default='/products/',
+                        help='маршрут каталога')
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS,
+                        help='одновременных клиентов')
+    parser.add_argument('--seconds', type=float, default=DEFAULT_SECONDS,
+                        help='длительность замера')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--with-proxy', action='store_true',
+                        help='поднять заменитель PgBouncer перед базой')
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.path, args.clients, args.seconds,
+                              args.port, args.with_proxy))
+
+
+if __name__ == '__main__':
+    main()
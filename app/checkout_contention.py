@@ -0,0 +1,163 @@
+"""Проверка оформления заказов при конкуренции за один товар.
+
+Запуск (на тестовой базе):
+    python -m app.checkout_contention
+    python -m app.checkout_contention --buyers 300 --stock 50
+    python -m app.checkout_contention --reserve
+
+Создаёт товар с остатком --stock и --buyers покупателей с этим
+товаром в корзине, одновременно оформляет все заказы и проверяет,
+что заказов ровно столько, сколько было остатка, а остаток не ушёл
+в минус. С --reserve покупатели сначала одновременно резервируют
+товар, и проверяется, что резерв в сумме не превышает остатка.
+Созданные данные удаляются после проверки.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, or_, select
+
+from app.database import async_session_maker
+from app.models.cart_items import CartItem
+from app.models.categories import Category
+from app.models.orders import Order, OrderItem
+from app.models.outbox import OutboxEvent
+from app.models.products import Product
+from app.models.reservations import StockReservation
+from app.models.users import User
+from app.reservations import reserve_stock
+from app.routers.orders import checkout_order
+
+DEFAULT_BUYERS = 300
+DEFAULT_STOCK = 50
+
+
+async def _create_fixture(buyers: int, stock: int) -> tuple[int, list[User]]:
+    """Товар с остатком stock и покупатели с ним в корзине."""
+    marker = uuid.uuid4().hex[:8]
+    async with async_session_maker() as session:
+        seller = User(email=f'contention-seller-{marker}@example.com',
+                      hashed_password='!', role='seller')
+        category = Category(name=f'contention-{marker}')
+        session.add_all([seller, category])
+        await session.flush()
+        product = Product(name=f'contention-{marker}', price=Decimal('1.00'),
+                          stock=stock, category_id=category.id,
+                          seller_id=seller.id)
+        users = [User(email=f'contention-{marker}-{number}@example.com',
+                      hashed_password='!', role='buyer')
+                 for number in range(buyers)]
+        session.add(product)
+        session.add_all(users)
+        await session.flush()
+        session.add_all([CartItem(user_id=user.id, product_id=product.id,
+                                  quantity=1)
+                         for user in users])
+        await session.commit()
+    return product.id, users
+
+
+async def _reserve(user: User, product_id: int) -> bool:
+    async with async_session_maker() as session:
+        failed = await reserve_stock(session, user.id, {product_id: 1})
+        await session.commit()
+    return not failed
+
+
+async def _checkout(user: User) -> int:
+    async with async_session_maker() as session:
+        try:
+            await checkout_order(idempotency_key=None, db=session,
+                                 current_user=user)
+        except HTTPException as exc:
+            return exc.status_code
+    return status.HTTP_201_CREATED
+
+
+async def _drop_fixture(product_id: int, users: list[User]) -> None:
+    user_ids = [user.id for user in users]
+    async with async_session_maker() as session:
+        product = await session.get(Product, product_id)
+        order_ids = (await session.scalars(
+            select(Order.id).where(Order.user_id.in_(user_ids))
+        )).all()
+        await session.execute(delete(OutboxEvent).where(or_(
+            (OutboxEvent.aggregate_type == 'order')
+            & OutboxEvent.aggregate_id.in_(order_ids),
+            (OutboxEvent.aggregate_type == 'product')
+            & (OutboxEvent.aggregate_id == product_id),
+        )))
+        # Заказы и позиции удаляются каскадом вместе с покупателями.
+        await session.execute(delete(User).where(User.id.in_(user_ids)))
+        await session.execute(delete(Product).where(Product.id == product_id))
+        await session.execute(
+            delete(Category).where(Category.id == product.category_id)
+        )
+        await session.execute(delete(User).where(User.id == product.seller_id))
+        await session.commit()
+
+
+async def run_contention(buyers: int, stock: int,
+                         reserve: bool = False) -> bool:
+    """Оформляет заказы одновременно и печатает итог; True — всё сошлось."""
+    expected = min(buyers, stock)
+    product_id, users = await _create_fixture(buyers, stock)
+    try:
+        if reserve:
+            reserved = await asyncio.gather(
+                *(_reserve(user, product_id) for user in users)
+            )
+            async with async_session_maker() as session:
+                total_reserved = await session.scalar(
+                    select(func.coalesce(func.sum(StockReservation.quantity),
+                                         0))
+                    .where(StockReservation.product_id == product_id)
+                )
+            print(f'{buyers} reservations: {reserved.count(True)} accepted, '
+                  f'reserved {total_reserved} of {stock}')
+            if total_reserved != expected:
+                return False
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(_checkout(user) for user in users))
+        elapsed = time.perf_counter() - started
+        async with async_session_maker() as session:
+            left = await session.scalar(
+                select(Product.stock).where(Product.id == product_id)
+            )
+            ordered = await session.scalar(
+                select(func.coalesce(func.sum(OrderItem.quantity), 0))
+                .where(OrderItem.product_id == product_id)
+            )
+    finally:
+        await _drop_fixture(product_id, users)
+
+    print(f'{buyers} checkouts in {elapsed:.2f}s: '
+          f'{dict(sorted(Counter(statuses).items()))}')
+    print(f'ordered {ordered} of {stock}, stock left {left}')
+    return (statuses.count(status.HTTP_201_CREATED) == expected
+            and ordered == expected and left == stock - expected)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--buyers', type=int, default=DEFAULT_BUYERS,
+                        help='число одновременных оформлений')
+    parser.add_argument('--stock', type=int, default=DEFAULT_STOCK,
+                        help='начальный остаток товара')
+    parser.add_argument('--reserve', action='store_true',
+                        help='перед оформлением зарезервировать товар')
+    args = parser.parse_args()
+    if not asyncio.run(run_contention(args.buyers, args.stock, args.reserve)):
+        print('FAILED: orders or reservations do not match stock')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,19 @@
-import os
+from app.settings import settings
 
-from dotenv import load_dotenv
-
-load_dotenv()
-SECRET_KEY = os.getenv('SECRET_KEY')
+SECRET_KEY = settings.secret_key
 ALGORITHM = 'HS256'
+# Сколько хеширований паролей выполняется одновременно.
+PASSWORD_HASH_WORKERS = settings.password_hash_workers
+# Алгоритм хеширования паролей: bcrypt или argon2 (нужен argon2-cffi).
+# Хеши другим алгоритмом или с меньшей стоимостью пересчитываются
+# при следующем успешном входе.
+PASSWORD_HASH_SCHEME = settings.password_hash_scheme
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+ARGON2_TIME_COST = settings.argon2_time_cost
+ARGON2_MEMORY_COST = settings.argon2_memory_cost
+# Где хранить счётчики ограничения попыток входа: memory или postgres.
+LOGIN_RATE_LIMIT_BACKEND = settings.login_rate_limit_backend
+# Обратные прокси, которым доверяем X-Forwarded-For; без них лимит
+# по IP считается по адресу прокси, то есть один на всех клиентов.
+TRUSTED_PROXIES = [host.strip() for host in settings.trusted_proxies.split(',')
+                   if host.strip()]
@@ -1,7 +1,10 @@
 from pathlib import Path
 
+from app.settings import settings
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_ROOT = BASE_DIR / 'media' / 'products'
 MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
 ALLOWED_IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/webp'}
-MAX_IMAGE_SIZE = 2 * 1024 * 1024
+MAX_IMAGE_SIZE = settings.max_image_size
+OUTBOX_FILE = BASE_DIR / settings.outbox_file
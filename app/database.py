@@ -1,19 +1,82 @@
-import os
+import dataclasses
+import uuid
+from typing import Any
 
-from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import NullPool
 
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-async_engine = create_async_engine(DATABASE_URL, echo=True)
+from app.settings import Settings, settings
+
+
+def _unique_statement_name() -> str:
+    return f'__asyncpg_{uuid.uuid4().hex}__'
+
+
+def engine_options(config: Settings) -> dict[str, Any]:
+    """Параметры create_async_engine из настроек пула и драйвера."""
+    if config.db_pgbouncer:
+        # В режиме transaction каждая транзакция может попасть на другое
+        # серверное соединение: подготовленные запросы не кэшируются и
+        # получают уникальные имена, а параметры сессии (server_settings)
+        # не передаются — PgBouncer их не пропускает. Пулом соединений
+        # занимается сам PgBouncer.
+        return {
+            'echo': config.db_echo,
+            'poolclass': NullPool,
+            'connect_args': {
+                'statement_cache_size': 0,
+                'prepared_statement_cache_size': 0,
+                'prepared_statement_name_func': _unique_statement_name,
+            },
+        }
+    connect_args: dict[str, Any] = {
+        'prepared_statement_cache_size': config.db_statement_cache_size,
+    }
+    if config.db_statement_timeout_ms:
+        connect_args['server_settings'] = {
+            'statement_timeout': str(config.db_statement_timeout_ms),
+        }
+    return {
+        'echo': config.db_echo,
+        'pool_size': config.db_pool_size,
+        'max_overflow': config.db_max_overflow,
+        'pool_timeout': config.db_pool_timeout,
+        'pool_recycle': config.db_pool_recycle,
+        'pool_pre_ping': config.db_pool_pre_ping,
+        'connect_args': connect_args,
+    }
+
+
+DATABASE_URL = settings.database_url
+async_engine = create_async_engine(DATABASE_URL, **engine_options(settings))
 async_session_maker = async_sessionmaker(
     async_engine, expire_on_commit=False, class_=AsyncSession
 )
+# Без DATABASE_REPLICA_URL читающие сессии идут в тот же primary.
+async_read_engine = (
+    create_async_engine(settings.database_replica_url,
+                        **engine_options(settings))
+    if settings.database_replica_url else async_engine
+)
+async_read_session_maker = async_sessionmaker(
+    async_read_engine, expire_on_commit=False, class_=AsyncSession
+)
+# Соединения с LISTEN живут долго и держат сессию, поэтому за
+# PgBouncer они идут к Postgres напрямую.
+async_listen_engine = (
+    create_async_engine(
+        settings.database_direct_url,
+        **engine_options(dataclasses.replace(
+            settings, db_pgbouncer=False, db_pool_size=2, db_max_overflow=2,
+        )),
+    )
+    if settings.db_pgbouncer else async_engine
+)
 
 
 class Base(DeclarativeBase):
@@ -1,9 +1,15 @@
 from collections.abc import AsyncGenerator
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import async_session_maker
+from app.database import (
+    async_engine,
+    async_read_engine,
+    async_read_session_maker,
+    async_session_maker,
+)
+from app.read_routing import primary_pins
 from app.repositories.category_repository import CategoryRepository
 from app.repositories.products_repository import ProductsRepository
 from app.repositories.reviews_repository import ReviewsRepository
@@ -13,12 +19,36 @@ from app.services.reviews_service import ReviewsService
 
 
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
-    """Предоставляет асинхронную сессию SQLAlchemy."""
+    """Предоставляет асинхронную сессию SQLAlchemy.
+
+    Создание сессии не трогает пул: соединение берётся первым
+    запросом к базе, так что обработчик, ответивший из кэша или
+    отклонённый валидацией, его не занимает. Подключается с
+    scope='function': сессия закрывается и отдаёт соединение сразу
+    после обработчика, а не после отправки ответа и фоновых задач.
+    """
     async with async_session_maker() as session:
         yield session
 
+
+async def get_async_read_db(
+        request: Request,
+) -> AsyncGenerator[AsyncSession, None]:
+    """Сессия для чтения: реплика, если она настроена.
+
+    Клиент, недавно что-то записавший, читает с primary, чтобы
+    увидеть свои изменения несмотря на отставание реплики.
+    """
+    if (async_read_engine is async_engine
+            or primary_pins.is_pinned(request)):
+        session_maker = async_session_maker
+    else:
+        session_maker = async_read_session_maker
+    async with session_maker() as session:
+        yield session
+
 def get_review_service(
-        db: AsyncSession = Depends(get_async_db)
+        db: AsyncSession = Depends(get_async_db, scope='function')
 ) -> ReviewsService:
     """Создает и возвращает отзыв."""
     review_repository = ReviewsRepository(db)
@@ -26,7 +56,7 @@ def get_review_service(
     return ReviewsService(review_repository, product_repository)
 
 def get_product_service(
-        db: AsyncSession = Depends(get_async_db)
+        db: AsyncSession = Depends(get_async_db, scope='function')
 ) -> ProductsService:
     """Создает и возвращает сервис товаров."""
     product_repository = ProductsRepository(db)
@@ -34,7 +64,25 @@ def get_product_service(
     return ProductsService(product_repository, category_repository)
 
 def get_category_service(
-        db: AsyncSession = Depends(get_async_db)
+        db: AsyncSession = Depends(get_async_db, scope='function')
 ) -> CategoryService:
     """Создает и возвращает сервис категорий."""
     return CategoryService(CategoryRepository(db))
+
+def get_review_read_service(
+        db: AsyncSession = Depends(get_async_read_db, scope='function')
+) -> ReviewsService:
+    """Сервис отзывов для чтения через get_async_read_db."""
+    return get_review_service(db)
+
+def get_product_read_service(
+        db: AsyncSession = Depends(get_async_read_db, scope='function')
+) -> ProductsService:
+    """Сервис товаров для чтения через get_async_read_db."""
+    return get_product_service(db)
+
+def get_category_read_service(
+        db: AsyncSession = Depends(get_async_read_db, scope='function')
+) -> CategoryService:
+    """Сервис категорий для чтения через get_async_read_db."""
+    return get_category_service(db)
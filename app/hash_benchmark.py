@@ -0,0 +1,81 @@
+"""Замер скорости хеширования паролей для разных настроек.
+
+Запуск:
+    python -m app.hash_benchmark
+    python -m app.hash_benchmark --seconds 5
+
+Печатает хешей в секунду на одно ядро (в одном потоке) для каждой
+настройки; пропускная способность входа примерно равна этому числу,
+умноженному на PASSWORD_HASH_WORKERS.
+"""
+import argparse
+import time
+
+from passlib.exc import MissingBackendError
+
+from app.auth import create_password_context
+from app.config import (
+    ARGON2_MEMORY_COST,
+    ARGON2_TIME_COST,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_SCHEME,
+)
+
+BENCHMARK_PASSWORD = 'correct horse battery staple'
+BENCHMARK_SETTINGS = [
+    {'scheme': 'bcrypt', 'bcrypt_rounds': 10},
+    {'scheme': 'bcrypt', 'bcrypt_rounds': 11},
+    {'scheme': 'bcrypt', 'bcrypt_rounds': 12},
+    {'scheme': 'bcrypt', 'bcrypt_rounds': 13},
+    {'scheme': 'argon2', 'argon2_time_cost': 2,
+     'argon2_memory_cost': 19 * 1024},
+    {'scheme': 'argon2', 'argon2_time_cost': 3,
+     'argon2_memory_cost': 64 * 1024},
+]
+
+
+def hashes_per_second(settings: dict, seconds: float) -> float:
+    """Сколько хешей в секунду успевает один поток."""
+    context = create_password_context(**settings)
+    context.hash(BENCHMARK_PASSWORD)
+    count = 0
+    started = time.perf_counter()
+    while (elapsed := time.perf_counter() - started) < seconds:
+        context.hash(BENCHMARK_PASSWORD)
+        count += 1
+    return count / elapsed
+
+
+def _describe(settings: dict) -> str:
+    if settings['scheme'] == 'bcrypt':
+        return f"bcrypt rounds={settings['bcrypt_rounds']}"
+    return (f"argon2 time_cost={settings['argon2_time_cost']} "
+            f"memory_cost={settings['argon2_memory_cost']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=2,
+                        help='длительность замера одной настройки')
+    args = parser.parse_args()
+
+    current = {'scheme': PASSWORD_HASH_SCHEME, 'bcrypt_rounds': BCRYPT_ROUNDS,
+               'argon2_time_cost': ARGON2_TIME_COST,
+               'argon2_memory_cost': ARGON2_MEMORY_COST}
+    current = {key: value for key, value in current.items()
+               if key == 'scheme' or key.startswith(current['scheme'])}
+    for settings in BENCHMARK_SETTINGS + [current]:
+        label = _describe(settings)
+        if settings is current:
+            label += ' (текущая)'
+        try:
+            rate = hashes_per_second(settings, args.seconds)
+        except MissingBackendError:
+            print(f'{label}: backend not installed')
+            continue
+        print(f'{label}: {rate:.1f} hashes/s per core, '
+              f'{1000 / rate:.1f} ms per hash')
+
+
+if __name__ == '__main__':
+    main()
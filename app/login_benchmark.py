@@ -0,0 +1,134 @@
+"""Задержка других запросов во время всплеска входов.
+
+Запуск (на тестовой базе):
+    python -m app.login_benchmark
+    python -m app.login_benchmark --logins 60 --probe-path /categories/
+
+Поднимает приложение на uvicorn в этом процессе, создаёт временного
+пользователя и одновременно отправляет --logins запросов
+POST /users/token, а всё это время раз в --probe-interval секунд
+запрашивает --probe-path. Печатает p50, p99 и максимум задержки
+пробных запросов: если хеширование пароля блокирует event loop, p99
+растёт до длительности всего всплеска. Ограничение попыток входа на
+время замера ослабляется, иначе всплеск упрётся в 429.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from urllib.parse import urlencode
+
+import uvicorn
+from sqlalchemy import delete
+
+from app.auth import hash_password_async
+from app.database import async_session_maker
+from app.main import app
+from app.models.users import User
+from app.rate_limit import MemoryTokenBucket, login_rate_limiter
+
+BENCHMARK_HOST = '127.0.0.1'
+BENCHMARK_PASSWORD = 'correct horse battery staple'
+DEFAULT_LOGINS = 60
+DEFAULT_PORT = 8765
+
+
+async def http_request(port: int, method: str, path: str,
+                       form: dict[str, str] | None = None) -> int:
+    """Один HTTP/1.1-запрос на отдельном соединении; возвращает код."""
+    body = urlencode(form).encode() if form else b''
+    head = (f'{method} {path} HTTP/1.1\r\n'
+            f'Host: {BENCHMARK_HOST}\r\n'
+            'Connection: close\r\n'
+            'Content-Type: application/x-www-form-urlencoded\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n')
+    reader, writer = await asyncio.open_connection(BENCHMARK_HOST, port)
+    try:
+        writer.write(head.encode() + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1,
+                             int(len(sorted_values) * fraction))]
+
+
+async def run_benchmark(logins: int, probe_path: str, probe_interval: float,
+                        port: int) -> None:
+    """Всплеск входов с параллельными пробными запросами."""
+    login_rate_limiter.by_ip = MemoryTokenBucket(logins, 1)
+    login_rate_limiter.by_username = MemoryTokenBucket(logins, 1)
+    email = f'login-benchmark-{uuid.uuid4().hex[:8]}@example.com'
+    async with async_session_maker() as session:
+        user = User(email=email, role='buyer',
+                    hashed_password=await hash_password_async(
+                        BENCHMARK_PASSWORD))
+        session.add(user)
+        await session.commit()
+
+    server = uvicorn.Server(uvicorn.Config(
+        app, host=BENCHMARK_HOST, port=port, log_level='warning'
+    ))
+    serving = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            await asyncio.sleep(0.05)
+        await http_request(port, 'GET', probe_path)
+
+        latencies: list[float] = []
+        burst_done = asyncio.Event()
+
+        async def probe() -> None:
+            while not burst_done.is_set():
+                started = time.perf_counter()
+                await http_request(port, 'GET', probe_path)
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(probe_interval)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(
+            http_request(port, 'POST', '/users/token',
+                         {'username': email, 'password': BENCHMARK_PASSWORD})
+            for _ in range(logins)
+        ))
+        burst = time.perf_counter() - started
+        burst_done.set()
+        await prober
+    finally:
+        server.should_exit = True
+        await serving
+        async with async_session_maker() as session:
+            await session.execute(delete(User).where(User.email == email))
+            await session.commit()
+
+    latencies.sort()
+    print(f'logins: {statuses.count(200)}/{logins} succeeded '
+          f'in {burst:.2f}s')
+    print(f'GET {probe_path} during burst: n={len(latencies)} '
+          f'p50={percentile(latencies, 0.5) * 1000:.1f}ms '
+          f'p99={percentile(latencies, 0.99) * 1000:.1f}ms '
+          f'max={latencies[-1] * 1000:.1f}ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=DEFAULT_LOGINS,
+                        help='число одновременных входов')
+    parser.add_argument('--probe-path', default='/',
+                        help='маршрут, задержка которого измеряется')
+    parser.add_argument('--probe-interval', type=float, default=0.005,
+                        help='пауза между пробными запросами, секунды')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.logins, args.probe_path,
+                              args.probe_interval, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,64 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from app.config import TRUSTED_PROXIES
+
+from app.database import async_engine, async_read_engine
+from app.order_events import order_status_broker
+from app.outbox import outbox_relay
+from app.partitions import run_partition_maintenance
+from app.principals import run_principal_invalidation_listener
+from app.query_limits import (
+    CancelOnDisconnectMiddleware,
+    pool_timeout_handler,
+    query_canceled_handler,
+)
+from app.rate_limit import run_rate_limit_pruner
+from app.read_routing import pin_primary_after_write
+from app.refresh_tokens import run_revocation_sync
+from app.reservations import run_reservation_sweeper
+from app.routers import (
+    analytics, categories, products, reviews, users, carts, orders
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Запускает фоновые задачи на время работы приложения."""
+    tasks = [asyncio.create_task(run_reservation_sweeper()),
+             asyncio.create_task(outbox_relay.run()),
+             asyncio.create_task(run_partition_maintenance()),
+             asyncio.create_task(run_principal_invalidation_listener()),
+             asyncio.create_task(run_rate_limit_pruner()),
+             asyncio.create_task(run_revocation_sync())]
+    yield
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    await order_status_broker.stop()
 
-from app.routers import categories, products, reviews, users, carts, orders
 
 app = FastAPI(
     title='FastAPI Интернет магазин',
-    version='0.1.0'
+    version='0.1.0',
+    lifespan=lifespan,
 )
+app.add_middleware(CancelOnDisconnectMiddleware)
+if TRUSTED_PROXIES:
+    app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=TRUSTED_PROXIES)
+app.add_exception_handler(DBAPIError, query_canceled_handler)
+app.add_exception_handler(PoolTimeoutError, pool_timeout_handler)
+if async_read_engine is not async_engine:
+    app.middleware('http')(pin_primary_after_write)
 app.mount('/media', StaticFiles(directory='media'), name='media')
 
 app.include_router(categories.router)
@@ -15,6 +67,7 @@ app.include_router(users.router)
 app.include_router(reviews.router)
 app.include_router(carts.router)
 app.include_router(orders.router)
+app.include_router(analytics.router)
 
 
 @app.get('/')
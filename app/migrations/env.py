@@ -1,8 +1,10 @@
 import asyncio
+import functools
 import os
+import re
 from logging.config import fileConfig
 
-from sqlalchemy import pool
+from sqlalchemy import pool, text
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from dotenv import load_dotenv
@@ -11,6 +13,7 @@ from alembic import context
 
 from app.database import Base
 from app import models
+from app.partitions import ARCHIVE_SCHEMA, PARTITIONED_TABLES
 load_dotenv()
 
 # this is the Alembic Config object, which provides
@@ -32,6 +35,38 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+# Месячные секции и DEFAULT создаются вне моделей (app.partitions),
+# отсоединённые лежат в схеме archive: autogenerate их не сравнивает.
+PARTITION_NAME_RE = re.compile(
+    rf"^({'|'.join(PARTITIONED_TABLES)})_(\d{{4}}_\d{{2}}|default)$"
+)
+
+
+@functools.cache
+def partition_foreign_keys() -> frozenset[tuple[str, str]]:
+    """Внешние ключи, которые Postgres сам клонирует на каждую секцию.
+
+    Например, order_items получает по копии ключа на orders для
+    каждой секции orders; в моделях их нет.
+    """
+    rows = context.get_bind().execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND conparentid <> 0"
+    ))
+    return frozenset(rows.tuples())
+
+
+def include_name(name, type_, parent_names) -> bool:
+    if type_ == "schema":
+        return name != ARCHIVE_SCHEMA
+    if type_ == "table":
+        return not PARTITION_NAME_RE.match(name)
+    if type_ == "foreign_key_constraint":
+        return ((parent_names["table_name"], name)
+                not in partition_foreign_keys())
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -63,7 +98,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
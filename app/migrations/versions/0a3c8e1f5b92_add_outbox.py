@@ -0,0 +1,47 @@
+"""add outbox
+
+Revision ID: 0a3c8e1f5b92
+Revises: f27d9b5e1c04
+Create Date: 2026-10-19 14:31:08.117542
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0a3c8e1f5b92'
+down_revision: Union[str, Sequence[str], None] = 'f27d9b5e1c04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('outbox_events',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('txid', sa.BigInteger(), server_default=sa.text('txid_current()'), nullable=False),
+    sa.Column('aggregate_type', sa.String(length=32), nullable=False),
+    sa.Column('aggregate_id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.String(length=64), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_events_txid_id', 'outbox_events', ['txid', 'id'], unique=False)
+    op.create_table('outbox_watermarks',
+    sa.Column('relay', sa.String(length=64), nullable=False),
+    sa.Column('last_txid', sa.BigInteger(), nullable=False),
+    sa.Column('last_event_id', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('relay')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('outbox_watermarks')
+    op.drop_index('ix_outbox_events_txid_id', table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -0,0 +1,195 @@
+"""partition orders by created_at
+
+Revision ID: 1b7e4d2a9c63
+Revises: 0a3c8e1f5b92
+Create Date: 2026-10-19 15:12:40.408917
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b7e4d2a9c63'
+down_revision: Union[str, Sequence[str], None] = '0a3c8e1f5b92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+ORDER_COLUMNS = 'id, user_id, status, total_amount, version, created_at, updated_at'
+ITEM_COLUMNS = ('id, order_id, created_at, product_id, seller_id, quantity, '
+                'unit_price, total_price')
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _rename_legacy(table: str, indexes: list[str]) -> None:
+    op.rename_table(table, f'{table}_legacy')
+    for index in indexes:
+        op.execute(f'DROP INDEX IF EXISTS {index}')
+    op.execute(f'ALTER INDEX IF EXISTS {table}_pkey '
+               f'RENAME TO {table}_legacy_pkey')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('order_idempotency_keys',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'key')
+    )
+    op.execute(
+        'INSERT INTO order_idempotency_keys (user_id, key, order_id, created_at) '
+        'SELECT user_id, idempotency_key, id, created_at FROM orders '
+        'WHERE idempotency_key IS NOT NULL'
+    )
+
+    op.execute('ALTER TABLE order_items '
+               'DROP CONSTRAINT IF EXISTS uq_order_product')
+    _rename_legacy('orders', ['ix_orders_user_idempotency_key',
+                              'ix_orders_user_created_at_id',
+                              'ix_orders_user_id'])
+    _rename_legacy('order_items', ['ix_order_items_seller_id_id',
+                                   'ix_order_items_order_id',
+                                   'ix_order_items_product_id'])
+
+    op.create_table('orders',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('orders_id_seq'::regclass)"), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='orders_user_id_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    op.create_table('order_items',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('order_items_id_seq'::regclass)"), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, comment='Время создания заказа, ключ секционирования'),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('seller_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('total_price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['order_id', 'created_at'], ['orders.id', 'orders.created_at'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], name='order_items_product_id_fkey'),
+    sa.ForeignKeyConstraint(['seller_id'], ['users.id'], name='order_items_seller_id_fkey'),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    sa.UniqueConstraint('order_id', 'product_id', 'created_at', name='uq_order_product'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+
+    oldest = op.get_bind().scalar(sa.text(
+        "SELECT (min(created_at) AT TIME ZONE 'UTC')::date FROM orders_legacy"
+    ))
+    today = datetime.now(timezone.utc).date()
+    month = date((oldest or today).year, (oldest or today).month, 1)
+    last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        for table in ('orders', 'order_items'):
+            op.execute(
+                f'CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table} '
+                f"FOR VALUES FROM ('{month} 00:00:00+00') "
+                f"TO ('{_add_months(month, 1)} 00:00:00+00')"
+            )
+        month = _add_months(month, 1)
+    for table in ('orders', 'order_items'):
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+    op.execute(f'INSERT INTO orders ({ORDER_COLUMNS}) '
+               f'SELECT {ORDER_COLUMNS} FROM orders_legacy')
+    op.execute(
+        f'INSERT INTO order_items ({ITEM_COLUMNS}) '
+        'SELECT i.id, i.order_id, o.created_at, i.product_id, i.seller_id, '
+        'i.quantity, i.unit_price, i.total_price '
+        'FROM order_items_legacy i JOIN orders_legacy o ON o.id = i.order_id'
+    )
+    op.execute('ALTER SEQUENCE orders_id_seq OWNED BY orders.id')
+    op.execute('ALTER SEQUENCE order_items_id_seq OWNED BY order_items.id')
+    op.drop_table('order_items_legacy')
+    op.drop_table('orders_legacy')
+
+    op.create_index(op.f('ix_orders_user_id'), 'orders', ['user_id'], unique=False)
+    op.create_index('ix_orders_user_created_at_id', 'orders', ['user_id', sa.literal_column('created_at DESC'), sa.literal_column('id DESC')], unique=False)
+    op.create_index(op.f('ix_order_items_order_id'), 'order_items', ['order_id'], unique=False)
+    op.create_index(op.f('ix_order_items_product_id'), 'order_items', ['product_id'], unique=False)
+    op.create_index('ix_order_items_seller_id_id', 'order_items', ['seller_id', sa.literal_column('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table('order_items', 'order_items_partitioned')
+    op.rename_table('orders', 'orders_partitioned')
+    for index in ('ix_orders_user_id', 'ix_orders_user_created_at_id',
+                  'ix_order_items_order_id', 'ix_order_items_product_id',
+                  'ix_order_items_seller_id_id'):
+        op.execute(f'DROP INDEX IF EXISTS {index}')
+    op.execute('ALTER TABLE order_items_partitioned '
+               'DROP CONSTRAINT uq_order_product')
+    op.execute('ALTER INDEX orders_pkey RENAME TO orders_partitioned_pkey')
+    op.execute('ALTER INDEX order_items_pkey '
+               'RENAME TO order_items_partitioned_pkey')
+
+    op.create_table('orders',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('orders_id_seq'::regclass)"), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('idempotency_key', sa.String(length=64), nullable=True),
+    sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='orders_user_id_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('order_items',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('order_items_id_seq'::regclass)"), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('seller_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('total_price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], name='order_items_product_id_fkey'),
+    sa.ForeignKeyConstraint(['seller_id'], ['users.id'], name='order_items_seller_id_fkey'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('order_id', 'product_id', name='uq_order_product')
+    )
+    op.execute(
+        f'INSERT INTO orders ({ORDER_COLUMNS}, idempotency_key) '
+        'SELECT o.id, o.user_id, o.status, o.total_amount, o.version, '
+        'o.created_at, o.updated_at, k.key FROM orders_partitioned o '
+        'LEFT JOIN order_idempotency_keys k ON k.order_id = o.id'
+    )
+    op.execute(
+        'INSERT INTO order_items (id, order_id, product_id, seller_id, '
+        'quantity, unit_price, total_price) '
+        'SELECT id, order_id, product_id, seller_id, quantity, unit_price, '
+        'total_price FROM order_items_partitioned'
+    )
+    op.execute('ALTER SEQUENCE orders_id_seq OWNED BY orders.id')
+    op.execute('ALTER SEQUENCE order_items_id_seq OWNED BY order_items.id')
+    op.drop_table('order_items_partitioned')
+    op.drop_table('orders_partitioned')
+    op.drop_table('order_idempotency_keys')
+
+    op.create_index(op.f('ix_orders_user_id'), 'orders', ['user_id'], unique=False)
+    op.create_index('ix_orders_user_created_at_id', 'orders', ['user_id', sa.literal_column('created_at DESC'), sa.literal_column('id DESC')], unique=False)
+    op.create_index('ix_orders_user_idempotency_key', 'orders', ['user_id', 'idempotency_key'], unique=True)
+    op.create_index(op.f('ix_order_items_order_id'), 'order_items', ['order_id'], unique=False)
+    op.create_index(op.f('ix_order_items_product_id'), 'order_items', ['product_id'], unique=False)
+    op.create_index('ix_order_items_seller_id_id', 'order_items', ['seller_id', sa.literal_column('id DESC')], unique=False)
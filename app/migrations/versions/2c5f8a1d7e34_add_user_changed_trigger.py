@@ -0,0 +1,57 @@
+"""add user changed trigger
+
+Revision ID: 2c5f8a1d7e34
+Revises: 1b7e4d2a9c63
+Create Date: 2026-10-19 16:04:27.551203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c5f8a1d7e34'
+down_revision: Union[str, Sequence[str], None] = '1b7e4d2a9c63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE FUNCTION notify_user_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('user_changed', OLD.id::text);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER users_notify_changed
+        AFTER UPDATE OF email, role, is_active ON users
+        FOR EACH ROW
+        WHEN (OLD.email IS DISTINCT FROM NEW.email
+              OR OLD.role IS DISTINCT FROM NEW.role
+              OR OLD.is_active IS DISTINCT FROM NEW.is_active)
+        EXECUTE FUNCTION notify_user_changed()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER users_notify_deleted
+        AFTER DELETE ON users
+        FOR EACH ROW
+        EXECUTE FUNCTION notify_user_changed()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER users_notify_deleted ON users')
+    op.execute('DROP TRIGGER users_notify_changed ON users')
+    op.execute('DROP FUNCTION notify_user_changed()')
@@ -0,0 +1,43 @@
+"""add refresh token families
+
+Revision ID: 4e1b7c9d3a58
+Revises: 3d9a6b4c2f17
+Create Date: 2026-10-19 17:20:13.664870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e1b7c9d3a58'
+down_revision: Union[str, Sequence[str], None] = '3d9a6b4c2f17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('refresh_token_families',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('current_jti', sa.String(length=32), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_refresh_token_families_user_id'), 'refresh_token_families', ['user_id'], unique=False)
+    op.create_index(op.f('ix_refresh_token_families_expires_at'), 'refresh_token_families', ['expires_at'], unique=False)
+    op.create_index('ix_refresh_token_families_revoked', 'refresh_token_families', ['expires_at'], unique=False, postgresql_where='revoked_at IS NOT NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_refresh_token_families_revoked', table_name='refresh_token_families', postgresql_where='revoked_at IS NOT NULL')
+    op.drop_index(op.f('ix_refresh_token_families_expires_at'), table_name='refresh_token_families')
+    op.drop_index(op.f('ix_refresh_token_families_user_id'), table_name='refresh_token_families')
+    op.drop_table('refresh_token_families')
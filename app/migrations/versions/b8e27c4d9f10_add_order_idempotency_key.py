@@ -0,0 +1,30 @@
+"""add order idempotency key
+
+Revision ID: b8e27c4d9f10
+Revises: 7d3f1a9c2b41
+Create Date: 2026-10-19 11:04:52.731960
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e27c4d9f10'
+down_revision: Union[str, Sequence[str], None] = '7d3f1a9c2b41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_index('ix_orders_user_idempotency_key', 'orders', ['user_id', 'idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_user_idempotency_key', table_name='orders')
+    op.drop_column('orders', 'idempotency_key')
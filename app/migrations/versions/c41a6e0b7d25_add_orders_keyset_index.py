@@ -0,0 +1,28 @@
+"""add orders keyset index
+
+Revision ID: c41a6e0b7d25
+Revises: b8e27c4d9f10
+Create Date: 2026-10-19 11:47:08.102634
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41a6e0b7d25'
+down_revision: Union[str, Sequence[str], None] = 'b8e27c4d9f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_user_created_at_id', 'orders', ['user_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_user_created_at_id', table_name='orders')
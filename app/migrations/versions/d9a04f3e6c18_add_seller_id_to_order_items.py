@@ -0,0 +1,37 @@
+"""add seller_id to order items
+
+Revision ID: d9a04f3e6c18
+Revises: c41a6e0b7d25
+Create Date: 2026-10-19 12:26:40.915377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a04f3e6c18'
+down_revision: Union[str, Sequence[str], None] = 'c41a6e0b7d25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('order_items', sa.Column('seller_id', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE order_items SET seller_id = products.seller_id "
+        "FROM products WHERE products.id = order_items.product_id"
+    )
+    op.alter_column('order_items', 'seller_id', nullable=False)
+    op.create_foreign_key('order_items_seller_id_fkey', 'order_items', 'users', ['seller_id'], ['id'])
+    op.create_index('ix_order_items_seller_id_id', 'order_items', ['seller_id', sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_items_seller_id_id', table_name='order_items')
+    op.drop_constraint('order_items_seller_id_fkey', 'order_items', type_='foreignkey')
+    op.drop_column('order_items', 'seller_id')
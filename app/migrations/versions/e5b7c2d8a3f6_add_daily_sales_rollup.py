@@ -0,0 +1,55 @@
+"""add daily sales rollup
+
+Revision ID: e5b7c2d8a3f6
+Revises: d9a04f3e6c18
+Create Date: 2026-10-19 13:05:17.264093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b7c2d8a3f6'
+down_revision: Union[str, Sequence[str], None] = 'd9a04f3e6c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('daily_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('seller_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('order_lines', sa.Integer(), nullable=False),
+    sa.Column('units_sold', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['seller_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('day', 'seller_id', 'product_id')
+    )
+    op.create_index('ix_daily_sales_seller_day', 'daily_sales', ['seller_id', 'day'], unique=False)
+    op.execute(
+        """
+        INSERT INTO daily_sales
+            (day, seller_id, product_id, order_lines, units_sold, revenue)
+        SELECT (orders.created_at AT TIME ZONE 'UTC')::date,
+               order_items.seller_id,
+               order_items.product_id,
+               count(*),
+               sum(order_items.quantity),
+               sum(order_items.total_price)
+        FROM order_items
+        JOIN orders ON orders.id = order_items.order_id
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_daily_sales_seller_day', table_name='daily_sales')
+    op.drop_table('daily_sales')
@@ -0,0 +1,28 @@
+"""add order version
+
+Revision ID: f27d9b5e1c04
+Revises: e5b7c2d8a3f6
+Create Date: 2026-10-19 13:52:44.580319
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f27d9b5e1c04'
+down_revision: Union[str, Sequence[str], None] = 'e5b7c2d8a3f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('orders', 'version')
@@ -1,10 +1,17 @@
 from .cart_items import CartItem
 from .categories import Category
-from .orders import Order, OrderItem
+from .orders import Order, OrderIdempotencyKey, OrderItem
+from .outbox import OutboxEvent, OutboxWatermark
 from .products import Product
+from .rate_limits import RateLimitBucket
+from .reservations import StockReservation
 from .reviews import Review
+from .sales import DailySales
+from .tokens import RefreshTokenFamily
 from .users import User
 
 __all__ = [
-    'Category', 'Product', 'User', 'Review', 'CartItem', 'Order', 'OrderItem'
+    'Category', 'Product', 'User', 'Review', 'CartItem', 'Order', 'OrderItem',
+    'OrderIdempotencyKey', 'StockReservation', 'DailySales', 'OutboxEvent',
+    'OutboxWatermark', 'RateLimitBucket', 'RefreshTokenFamily',
 ]
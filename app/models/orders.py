@@ -2,7 +2,8 @@ from datetime import datetime
 from decimal import Decimal
 
 from sqlalchemy import (
-    ForeignKey, String, Numeric, DateTime, Integer, func,  UniqueConstraint
+    ForeignKey, String, Numeric, DateTime, Integer, func,  UniqueConstraint,
+    Index, ForeignKeyConstraint, DDL, event,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -10,9 +11,13 @@ from app.database import Base
 
 
 class Order(Base):
+    """Заказ; таблица секционирована по месяцам created_at."""
+
     __tablename__ = 'orders'
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
         ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True
     )
@@ -20,8 +25,11 @@ class Order(Base):
                                         nullable=False)
     total_amount: Mapped[Decimal] = mapped_column(Numeric(10, 2), default=0,
                                                   nullable=False)
+    version: Mapped[int] = mapped_column(Integer, default=1,
+                                         server_default='1', nullable=False)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True), server_default=func.now(),
+        primary_key=True
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(),
@@ -34,21 +42,37 @@ class Order(Base):
     )
 
 
+Index('ix_orders_user_created_at_id',
+      Order.user_id, Order.created_at.desc(), Order.id.desc())
+
 
 class OrderItem(Base):
+    """Позиция заказа; секционирована так же, как orders."""
+
     __tablename__ = 'order_items'
 
     __table_args__ = (
-        UniqueConstraint('order_id', 'product_id', name='uq_order_product'),
+        ForeignKeyConstraint(
+            ['order_id', 'created_at'], ['orders.id', 'orders.created_at'],
+            ondelete='CASCADE',
+        ),
+        UniqueConstraint('order_id', 'product_id', 'created_at',
+                         name='uq_order_product'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
     )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-    order_id: Mapped[int] = mapped_column(
-        ForeignKey('orders.id', ondelete='CASCADE'), nullable=False, index=True
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    order_id: Mapped[int] = mapped_column(nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True,
+        comment='Время создания заказа, ключ секционирования'
     )
     product_id: Mapped[int] = mapped_column(
         ForeignKey('products.id'), nullable=False, index=True
     )
+    seller_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id'), nullable=False
+    )
     quantity: Mapped[int] = mapped_column(Integer, nullable=False)
     unit_price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     total_price: Mapped[Decimal] = mapped_column(
@@ -59,3 +83,32 @@ class OrderItem(Base):
     product: Mapped['Product'] = relationship(
         'Product', back_populates='order_items'
     )
+
+
+Index('ix_order_items_seller_id_id', OrderItem.seller_id, OrderItem.id.desc())
+
+
+class OrderIdempotencyKey(Base):
+    """Ключ идемпотентности оформления заказа.
+
+    Вынесен из секционированной orders: уникальность там возможна только
+    вместе с created_at.
+    """
+
+    __tablename__ = 'order_idempotency_keys'
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), primary_key=True
+    )
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    order_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+# Страховочные секции для строк вне созданных диапазонов.
+for _table in (Order.__table__, OrderItem.__table__):
+    event.listen(_table, 'after_create', DDL(
+        'CREATE TABLE %(table)s_default PARTITION OF %(table)s DEFAULT'
+    ))
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class OutboxEvent(Base):
+    """Событие для внешних систем, записанное вместе с изменением."""
+
+    __tablename__ = 'outbox_events'
+
+    __table_args__ = (
+        Index('ix_outbox_events_txid_id', 'txid', 'id'),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    txid: Mapped[int] = mapped_column(
+        BigInteger, server_default=func.txid_current(), nullable=False
+    )
+    aggregate_type: Mapped[str] = mapped_column(String(32), nullable=False)
+    aggregate_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    event_type: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+class OutboxWatermark(Base):
+    """Позиция, до которой ретранслятор уже доставил события."""
+
+    __tablename__ = 'outbox_watermarks'
+
+    relay: Mapped[str] = mapped_column(String(64), primary_key=True)
+    last_txid: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    last_event_id: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(),
+        onupdate=func.now(), nullable=False
+    )
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from sqlalchemy import (
+    DateTime, ForeignKey, Index, Integer, UniqueConstraint, func
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class StockReservation(Base):
+    """Временный резерв остатка товара под корзину пользователя."""
+
+    __tablename__ = 'stock_reservations'
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'product_id',
+                         name='uq_reservation_user_product'),
+        Index('ix_stock_reservations_product_expires',
+              'product_id', 'expires_at'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), nullable=False
+    )
+    product_id: Mapped[int] = mapped_column(
+        ForeignKey('products.id', ondelete='CASCADE'), nullable=False
+    )
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
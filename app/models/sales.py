@@ -0,0 +1,31 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import Date, ForeignKey, Index, Integer, Numeric
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class DailySales(Base):
+    """Дневная сводка продаж по продавцу и товару."""
+
+    __tablename__ = 'daily_sales'
+
+    __table_args__ = (
+        Index('ix_daily_sales_seller_day', 'seller_id', 'day'),
+    )
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    seller_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), primary_key=True
+    )
+    product_id: Mapped[int] = mapped_column(
+        ForeignKey('products.id', ondelete='CASCADE'), primary_key=True
+    )
+    order_lines: Mapped[int] = mapped_column(Integer, nullable=False,
+                                              default=0)
+    units_sold: Mapped[int] = mapped_column(Integer, nullable=False,
+                                            default=0)
+    revenue: Mapped[Decimal] = mapped_column(Numeric(14, 2), nullable=False,
+                                             default=0)
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Index, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class RefreshTokenFamily(Base):
+    """Цепочка refresh-токенов одного входа.
+
+    Хранится только jti последнего выданного токена: предъявление
+    любого более старого означает повторное использование.
+    """
+
+    __tablename__ = 'refresh_token_families'
+
+    __table_args__ = (
+        Index('ix_refresh_token_families_revoked', 'expires_at',
+              postgresql_where='revoked_at IS NOT NULL'),
+    )
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), nullable=False,
+        index=True
+    )
+    current_jti: Mapped[str] = mapped_column(String(32), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+    revoked_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
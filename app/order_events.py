@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.database import async_listen_engine
+
+logger = logging.getLogger(__name__)
+
+ORDER_STATUS_CHANNEL = 'order_status'
+SUBSCRIBER_QUEUE_SIZE = 100
+RECONNECT_DELAY_SECONDS = 5
+
+
+async def notify_order_status(
+        db: AsyncSession, order_id: int, user_id: int, status: str,
+        version: int,
+) -> None:
+    """Ставит уведомление о смене статуса в текущую транзакцию.
+
+    Postgres доставляет NOTIFY слушателям только после COMMIT, поэтому
+    откаченное изменение клиентам не уйдёт.
+    """
+    payload = json.dumps({'order_id': order_id, 'user_id': user_id,
+                          'status': status, 'version': version})
+    await db.execute(select(func.pg_notify(ORDER_STATUS_CHANNEL, payload)))
+
+
+class OrderStatusBroker:
+    """Раздаёт уведомления о статусах заказов подписчикам воркера.
+
+    Каждый воркер держит одно соединение с LISTEN на канал и раскладывает
+    пришедшие события по очередям подписчиков-владельцев заказа.
+    Соединение открывается при первой подписке.
+    """
+
+    def __init__(self, channel: str = ORDER_STATUS_CHANNEL) -> None:
+        self.channel = channel
+        self._subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+        self._connection: AsyncConnection | None = None
+        # Оборванные соединения ещё числятся выданными из пула.
+        self._lost_connections: list[AsyncConnection] = []
+        self._lock = asyncio.Lock()
+        self._reconnect_task: asyncio.Task | None = None
+
+    async def _listen(self) -> None:
+        async with self._lock:
+            if self._connection is not None:
+                return
+            connection = await async_listen_engine.connect()
+            try:
+                raw = await connection.get_raw_connection()
+                driver = raw.driver_connection
+                driver.add_termination_listener(self._on_terminate)
+                await driver.add_listener(self.channel, self._on_notify)
+            except BaseException:
+                await connection.close()
+                raise
+            self._connection = connection
+
+    async def _discard_lost_connections(self) -> None:
+        while self._lost_connections:
+            connection = self._lost_connections.pop()
+            try:
+                await connection.invalidate()
+            except Exception:
+                logger.exception('Failed to invalidate lost listener '
+                                 'connection')
+
+    async def stop(self) -> None:
+        """Снимает подписку на канал и возвращает соединение в пул."""
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        await self._discard_lost_connections()
+        async with self._lock:
+            connection, self._connection = self._connection, None
+            if connection is None:
+                return
+            raw = await connection.get_raw_connection()
+            driver = raw.driver_connection
+            driver.remove_termination_listener(self._on_terminate)
+            if not driver.is_closed():
+                await driver.remove_listener(self.channel, self._on_notify)
+            await connection.close()
+
+    def _on_notify(self, connection, pid: int, channel: str,
+                   payload: str) -> None:
+        event = json.loads(payload)
+        for queue in self._subscribers.get(event['user_id'], ()):
+            if queue.full():
+                # Медленный клиент: важнее последний статус, чем старые.
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def _on_terminate(self, connection) -> None:
+        logger.warning('Order status listener connection was lost')
+        if self._connection is not None:
+            self._lost_connections.append(self._connection)
+            self._connection = None
+        if self._reconnect_task is None:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        """Освобождает оборванное соединение и, если есть подписчики,
+        снова открывает LISTEN."""
+        try:
+            await self._discard_lost_connections()
+            while self._subscribers:
+                try:
+                    await self._listen()
+                    return
+                except Exception:
+                    logger.exception('Order status listener reconnect failed')
+                    await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+        finally:
+            self._reconnect_task = None
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[asyncio.Queue]:
+        """Очередь событий по заказам пользователя на время подключения."""
+        await self._listen()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers[user_id]
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[user_id]
+
+
+order_status_broker = OrderStatusBroker()
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Protocol
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Select, delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import constants
+from app.database import async_session_maker
+from app.models.outbox import OutboxEvent, OutboxWatermark
+
+logger = logging.getLogger(__name__)
+
+RELAY_NAME = 'default'
+RELAY_BATCH_SIZE = 500
+RELAY_IDLE_SECONDS = 1
+RELAY_ERROR_DELAY_SECONDS = 5
+OUTBOX_RETENTION = timedelta(days=7)
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+def add_outbox_event(
+        db: AsyncSession, aggregate_type: str, aggregate_id: int,
+        event_type: str, payload: dict,
+) -> None:
+    """Добавляет событие в outbox текущей транзакции.
+
+    Событие сохраняется только вместе с изменением, которое его вызвало:
+    коммит записывает оба, откат не оставляет ни одного.
+    """
+    db.add(OutboxEvent(
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        event_type=event_type,
+        payload=jsonable_encoder(payload, custom_encoder={Decimal: str}),
+    ))
+
+
+def insert_outbox_events(rows: Select):
+    """INSERT ... SELECT событий в outbox из строк запроса.
+
+    rows отдаёт aggregate_type, aggregate_id, event_type и payload —
+    так события целой пачки изменений пишутся одним запросом.
+    """
+    return insert(OutboxEvent).from_select(
+        ['aggregate_type', 'aggregate_id', 'event_type', 'payload'], rows
+    )
+
+
+class OutboxSink(Protocol):
+    """Получатель пачек событий из outbox."""
+
+    async def publish(self, events: list[dict]) -> None:
+        """Доставляет пачку; исключение оставляет её к повторной отправке."""
+
+
+class NdjsonFileSink:
+    """Дописывает события в файл, по одному JSON-объекту на строку."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    async def publish(self, events: list[dict]) -> None:
+        lines = ''.join(json.dumps(event, ensure_ascii=False) + '\n'
+                        for event in events)
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open('a', encoding='utf-8') as file:
+            file.write(lines)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class OutboxRelay:
+    """Переносит события из outbox в получателей пачками.
+
+    Позиция хранится в outbox_watermarks как пара (txid, id). Читаются
+    только события транзакций старше самой старой незавершённой
+    (txid_snapshot_xmin), поэтому событие, закоммиченное позже соседей
+    с большим id, не окажется позади водяного знака. Пачка доставляется
+    и знак сдвигается одним коммитом; строка знака блокируется
+    FOR UPDATE SKIP LOCKED, так что из нескольких воркеров пачку
+    обрабатывает один. Доставка — как минимум один раз.
+    """
+
+    def __init__(self, sinks: list[OutboxSink],
+                 name: str = RELAY_NAME,
+                 batch_size: int = RELAY_BATCH_SIZE) -> None:
+        self.sinks = sinks
+        self.name = name
+        self.batch_size = batch_size
+        self._watermark_ready = False
+
+    def add_sink(self, sink: OutboxSink) -> None:
+        """Подключает ещё одного получателя событий."""
+        self.sinks.append(sink)
+
+    async def relay_batch(self) -> int:
+        """Доставляет одну пачку и возвращает число событий в ней."""
+        async with async_session_maker() as session:
+            if not self._watermark_ready:
+                await session.execute(
+                    pg_insert(OutboxWatermark)
+                    .values(relay=self.name, last_txid=0, last_event_id=0)
+                    .on_conflict_do_nothing(
+                        index_elements=[OutboxWatermark.relay]
+                    )
+                )
+                await session.commit()
+                self._watermark_ready = True
+
+            watermark = await session.scalar(
+                select(OutboxWatermark)
+                .where(OutboxWatermark.relay == self.name)
+                .with_for_update(skip_locked=True)
+            )
+            if watermark is None:
+                return 0
+            result = await session.scalars(
+                select(OutboxEvent)
+                .where(
+                    tuple_(OutboxEvent.txid, OutboxEvent.id)
+                    > tuple_(watermark.last_txid, watermark.last_event_id),
+                    OutboxEvent.txid < func.txid_snapshot_xmin(
+                        func.txid_current_snapshot()
+                    ),
+                )
+                .order_by(OutboxEvent.txid, OutboxEvent.id)
+                .limit(self.batch_size)
+            )
+            events = result.all()
+            if not events:
+                await session.rollback()
+                return 0
+
+            batch = [
+                {
+                    'id': event.id,
+                    'aggregate_type': event.aggregate_type,
+                    'aggregate_id': event.aggregate_id,
+                    'event_type': event.event_type,
+                    'payload': event.payload,
+                    'created_at': event.created_at.isoformat(),
+                }
+                for event in events
+            ]
+            for sink in self.sinks:
+                await sink.publish(batch)
+
+            last = events[-1]
+            await session.execute(
+                update(OutboxWatermark)
+                .where(OutboxWatermark.relay == self.name)
+                .values(last_txid=last.txid, last_event_id=last.id)
+            )
+            await session.commit()
+            return len(events)
+
+    async def prune(self) -> int:
+        """Удаляет доставленные события старше срока хранения."""
+        async with async_session_maker() as session:
+            watermark = select(OutboxWatermark.last_txid).where(
+                OutboxWatermark.relay == self.name
+            ).scalar_subquery()
+            result = await session.execute(
+                delete(OutboxEvent)
+                .where(OutboxEvent.txid < watermark,
+                       OutboxEvent.created_at < func.now() - OUTBOX_RETENTION)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount
+
+    async def run(self) -> None:
+        """Фоновая задача: отправляет пачки, пока они есть, затем ждёт."""
+        loop = asyncio.get_running_loop()
+        next_prune = loop.time()
+        while True:
+            try:
+                while await self.relay_batch() == self.batch_size:
+                    pass
+                if loop.time() >= next_prune:
+                    await self.prune()
+                    next_prune = loop.time() + PRUNE_INTERVAL_SECONDS
+            except Exception:
+                logger.exception('Outbox relay failed')
+                await asyncio.sleep(RELAY_ERROR_DELAY_SECONDS)
+                continue
+            await asyncio.sleep(RELAY_IDLE_SECONDS)
+
+
+outbox_relay = OutboxRelay(sinks=[NdjsonFileSink(constants.OUTBOX_FILE)])
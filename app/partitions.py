@@ -0,0 +1,183 @@
+"""Обслуживание месячных секций orders и order_items.
+
+Запуск вручную:
+    python -m app.partitions ensure
+    python -m app.partitions archive --before 2025-01-01
+"""
+import argparse
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.database import async_engine
+from app.models.orders import OrderIdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# Порядок важен: order_items ссылается на orders.
+PARTITIONED_TABLES = ('orders', 'order_items')
+PARTITION_MONTHS_AHEAD = 3
+MAINTENANCE_INTERVAL_SECONDS = 24 * 60 * 60
+ARCHIVE_SCHEMA = 'archive'
+LOCK_TIMEOUT = '5s'
+# Ключ advisory-блокировки: обслуживание секций идёт в одном воркере.
+PARTITION_LOCK_KEY = 424_040
+PARTITION_NAME_RE = re.compile(r'^orders_(?P<year>\d{4})_(?P<month>\d{2})$')
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Имя секции таблицы за месяц, например orders_2026_10."""
+    return f'{table}_{month:%Y_%m}'
+
+
+async def _lock_partitions(conn: AsyncConnection) -> None:
+    """Ждёт, пока другие воркеры закончат с секциями, до конца транзакции.
+
+    Без блокировки два воркера одновременно видят секцию отсутствующей
+    и второй CREATE TABLE падает с DuplicateTable.
+    """
+    await conn.execute(text('SELECT pg_advisory_xact_lock(:key)'),
+                       {'key': PARTITION_LOCK_KEY})
+
+
+async def _existing_partitions(
+        conn: AsyncConnection, table: str
+) -> set[str]:
+    result = await conn.execute(
+        text(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = CAST(:table AS regclass)'
+        ),
+        {'table': table},
+    )
+    return set(result.scalars())
+
+
+async def ensure_order_partitions(
+        months_ahead: int = PARTITION_MONTHS_AHEAD,
+) -> list[str]:
+    """Создаёт секции с текущего месяца на months_ahead вперёд.
+
+    Секции заводятся заранее, чтобы новые заказы не попадали в
+    секцию DEFAULT: из непустой DEFAULT нельзя выделить месяц без
+    переноса строк. Возвращает имена созданных секций.
+    """
+    today = datetime.now(timezone.utc).date()
+    first = date(today.year, today.month, 1)
+    months = [_add_months(first, offset) for offset in range(months_ahead + 1)]
+    created = []
+    async with async_engine.begin() as conn:
+        await _lock_partitions(conn)
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        for table in PARTITIONED_TABLES:
+            existing = await _existing_partitions(conn, table)
+            for month in months:
+                name = partition_name(table, month)
+                if name in existing:
+                    continue
+                await conn.execute(text(
+                    f'CREATE TABLE {name} PARTITION OF {table} '
+                    f"FOR VALUES FROM ('{month} 00:00:00+00') "
+                    f"TO ('{_add_months(month, 1)} 00:00:00+00')"
+                ))
+                created.append(name)
+    return created
+
+
+async def archive_order_partitions(before: date) -> list[str]:
+    """Отсоединяет секции за месяцы, целиком лежащие раньше before.
+
+    Отсоединённые таблицы переносятся в схему archive и больше не
+    участвуют в запросах к orders/order_items. Сначала отсоединяются
+    позиции (и снимается их внешний ключ на orders), затем заказы.
+    Ключи идемпотентности этих заказов удаляются.
+    """
+    cutoff = date(before.year, before.month, 1)
+    archived = []
+    async with async_engine.begin() as conn:
+        await _lock_partitions(conn)
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        await conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}'))
+        months = sorted(
+            date(int(match['year']), int(match['month']), 1)
+            for name in await _existing_partitions(conn, 'orders')
+            if (match := PARTITION_NAME_RE.match(name))
+        )
+        for month in months:
+            if _add_months(month, 1) > cutoff:
+                break
+            for table in reversed(PARTITIONED_TABLES):
+                name = partition_name(table, month)
+                await conn.execute(text(
+                    f'ALTER TABLE {table} DETACH PARTITION {name}'
+                ))
+                foreign_keys = await conn.execute(
+                    text(
+                        'SELECT conname FROM pg_constraint '
+                        'WHERE conrelid = CAST(:name AS regclass) '
+                        "AND contype = 'f' "
+                        "AND confrelid = CAST('orders' AS regclass)"
+                    ),
+                    {'name': name},
+                )
+                for constraint in foreign_keys.scalars().all():
+                    await conn.execute(text(
+                        f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"'
+                    ))
+                await conn.execute(text(
+                    f'ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}'
+                ))
+                archived.append(name)
+        if archived:
+            await conn.execute(
+                delete(OrderIdempotencyKey)
+                .where(OrderIdempotencyKey.created_at < datetime(
+                    cutoff.year, cutoff.month, 1, tzinfo=timezone.utc
+                ))
+            )
+    return archived
+
+
+async def run_partition_maintenance() -> None:
+    """Фоновая задача, заранее создающая секции заказов."""
+    while True:
+        try:
+            created = await ensure_order_partitions()
+            if created:
+                logger.info('Created order partitions: %s', created)
+        except Exception:
+            logger.exception('Order partition maintenance failed')
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    ensure = commands.add_parser('ensure', help='создать будущие секции')
+    ensure.add_argument('--months-ahead', type=int,
+                        default=PARTITION_MONTHS_AHEAD)
+    archive = commands.add_parser('archive',
+                                  help='отсоединить старые секции')
+    archive.add_argument('--before', type=date.fromisoformat, required=True,
+                         help='архивировать месяцы раньше этой даты')
+    args = parser.parse_args()
+
+    if args.command == 'ensure':
+        names = asyncio.run(ensure_order_partitions(args.months_ahead))
+    else:
+        names = asyncio.run(archive_order_partitions(args.before))
+    print('\n'.join(names) or 'nothing to do')
+
+
+if __name__ == '__main__':
+    main()
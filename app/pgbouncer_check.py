@@ -0,0 +1,319 @@
+"""Проверка режима DB_PGBOUNCER на заменителе PgBouncer.
+
+Запуск (Postgres из DATABASE_DIRECT_URL или DATABASE_URL):
+    python -m app.pgbouncer_check
+    python -m app.pgbouncer_check --backends 3 --connections 30
+
+Поднимает в этом процессе TransactionPoolingProxy — минимальный
+аналог PgBouncer в pool_mode=transaction: каждая транзакция клиента
+выполняется на одном из --backends серверных соединений, которое
+освобождается при ReadyForQuery(idle). Через прокси по очереди
+открываются --connections соединений с обычными параметрами движка
+и с DB_PGBOUNCER=true. Обычные должны падать на подготовленных
+запросах (InvalidSQLStatementNameError), режим PgBouncer — проходить.
+"""
+import argparse
+import asyncio
+import base64
+import dataclasses
+import hashlib
+import hmac
+import os
+import struct
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.database import engine_options
+from app.settings import settings
+
+PROXY_HOST = '127.0.0.1'
+DEFAULT_PORT = 6433
+DEFAULT_BACKENDS = 3
+DEFAULT_CONNECTIONS = 30
+PROTOCOL_VERSION = 196608
+SSL_REQUEST_CODES = (80877103, 80877104)
+INVALID_STATEMENT_NAME_SQLSTATE = '26000'
+# Как и PgBouncer, прокси не пропускает неизвестные параметры запуска.
+ALLOWED_STARTUP_PARAMETERS = frozenset({
+    'user', 'database', 'application_name', 'client_encoding',
+})
+CHECK_QUERIES = (
+    text('SELECT count(*) FROM pg_class WHERE relpages >= :pages'),
+    text('SELECT typname FROM pg_type WHERE oid = :oid'),
+)
+
+
+def _message(kind: bytes, body: bytes = b'') -> bytes:
+    return kind + struct.pack('!i', len(body) + 4) + body
+
+
+async def _read_message(reader: asyncio.StreamReader) -> tuple[bytes, bytes]:
+    kind = await reader.readexactly(1)
+    (length,) = struct.unpack('!i', await reader.readexactly(4))
+    return kind, await reader.readexactly(length - 4)
+
+
+def _error(code: str, detail: str) -> bytes:
+    fields = f'SFATAL\0C{code}\0M{detail}\0\0'.encode()
+    return _message(b'E', fields)
+
+
+def _error_text(body: bytes) -> str:
+    for field in body.split(b'\0'):
+        if field.startswith(b'M'):
+            return field[1:].decode()
+    return body.decode(errors='replace')
+
+
+class _Backend:
+    """Серверное соединение с Postgres, выдаваемое на одну транзакцию."""
+
+    def __init__(self) -> None:
+        self.reader: asyncio.StreamReader
+        self.writer: asyncio.StreamWriter
+        self.parameters: list[bytes] = []
+
+    async def connect(self, url: URL) -> '_Backend':
+        host = url.host or url.query.get('host') or '/tmp'
+        port = url.port or 5432
+        if host.startswith('/'):
+            self.reader, self.writer = await asyncio.open_unix_connection(
+                f'{host}/.s.PGSQL.{port}'
+            )
+        else:
+            self.reader, self.writer = await asyncio.open_connection(
+                host, port
+            )
+        user = url.username or os.environ.get('USER', 'postgres')
+        startup = (struct.pack('!i', PROTOCOL_VERSION)
+                   + f'user\0{user}\0database\0{url.database}\0\0'.encode())
+        self.writer.write(struct.pack('!i', len(startup) + 4) + startup)
+        await self._authenticate(user, url.password or '')
+        return self
+
+    async def _authenticate(self, user: str, password: str) -> None:
+        client_first = server_first = ''
+        while True:
+            kind, body = await _read_message(self.reader)
+            if kind == b'E':
+                raise ConnectionError(_error_text(body))
+            if kind == b'S':
+                self.parameters.append(_message(kind, body))
+            if kind == b'Z':
+                return
+            if kind != b'R':
+                continue
+            (code,) = struct.unpack('!i', body[:4])
+            if code == 3:
+                self.writer.write(_message(b'p', password.encode() + b'\0'))
+            elif code == 5:
+                inner = hashlib.md5((password + user).encode()).hexdigest()
+                outer = hashlib.md5(inner.encode() + body[4:8]).hexdigest()
+                self.writer.write(_message(b'p', f'md5{outer}\0'.encode()))
+            elif code == 10:
+                nonce = base64.b64encode(os.urandom(18)).decode()
+                client_first = f'n=,r={nonce}'
+                data = f'n,,{client_first}'.encode()
+                self.writer.write(_message(
+                    b'p', b'SCRAM-SHA-256\0' + struct.pack('!i', len(data))
+                    + data
+                ))
+            elif code == 11:
+                server_first = body[4:].decode()
+                self.writer.write(_message(b'p', _scram_final(
+                    password, client_first, server_first
+                ).encode()))
+            elif code not in (0, 12):
+                raise ConnectionError(f'Unsupported auth method {code}')
+
+
+def _scram_final(password: str, client_first: str, server_first: str) -> str:
+    """Финальное сообщение клиента SCRAM-SHA-256 (RFC 5802)."""
+    attributes = dict(item.split('=', 1) for item in server_first.split(','))
+    salted = hashlib.pbkdf2_hmac(
+        'sha256', password.encode(), base64.b64decode(attributes['s']),
+        int(attributes['i']),
+    )
+    client_key = hmac.digest(salted, b'Client Key', 'sha256')
+    without_proof = f"c=biws,r={attributes['r']}"
+    auth_message = f'{client_first},{server_first},{without_proof}'.encode()
+    signature = hmac.digest(hashlib.sha256(client_key).digest(),
+                            auth_message, 'sha256')
+    proof = bytes(a ^ b for a, b in zip(client_key, signature))
+    return f'{without_proof},p={base64.b64encode(proof).decode()}'
+
+
+class TransactionPoolingProxy:
+    """Минимальный аналог PgBouncer в режиме pool_mode=transaction.
+
+    Клиенты входят без пароля. Серверное соединение выдаётся клиенту
+    на время транзакции и возвращается в общий пул, как только сервер
+    сообщит ReadyForQuery(idle), — поэтому подготовленный запрос,
+    созданный в одной транзакции, в следующей может не найтись.
+    """
+
+    def __init__(self, backend_url: URL, size: int) -> None:
+        self.backend_url = backend_url
+        self.size = size
+        self.transactions = 0
+        self._pool: asyncio.Queue[_Backend] = asyncio.Queue()
+        self._backends: list[_Backend] = []
+        self._server: asyncio.Server | None = None
+
+    async def start(self, port: int) -> None:
+        for _ in range(self.size):
+            backend = await _Backend().connect(self.backend_url)
+            self._backends.append(backend)
+            self._pool.put_nowait(backend)
+        self._server = await asyncio.start_server(self._serve_client,
+                                                  PROXY_HOST, port)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for backend in self._backends:
+            backend.writer.close()
+
+    async def _serve_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        try:
+            if not await self._accept_startup(reader, writer):
+                return
+            backend: _Backend | None = None
+            relay: asyncio.Task | None = None
+            while True:
+                kind, body = await _read_message(reader)
+                if kind == b'X':
+                    break
+                if backend is None or relay.done():
+                    backend = await self._pool.get()
+                    self.transactions += 1
+                    relay = asyncio.create_task(self._relay(backend, writer))
+                backend.writer.write(_message(kind, body))
+            if relay is not None and not relay.done():
+                backend.writer.write(_message(b'Q', b'ROLLBACK\0'))
+                await relay
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _accept_startup(self, reader: asyncio.StreamReader,
+                              writer: asyncio.StreamWriter) -> bool:
+        while True:
+            (length,) = struct.unpack('!i', await reader.readexactly(4))
+            body = await reader.readexactly(length - 4)
+            (code,) = struct.unpack('!i', body[:4])
+            if code not in SSL_REQUEST_CODES:
+                break
+            writer.write(b'N')
+        names = body[4:].split(b'\0')[0::2]
+        unsupported = [name.decode() for name in names
+                       if name and name.decode()
+                       not in ALLOWED_STARTUP_PARAMETERS]
+        if code != PROTOCOL_VERSION or unsupported:
+            writer.write(_error(
+                '08P01', f'unsupported startup parameter: {unsupported}'
+            ))
+            await writer.drain()
+            writer.close()
+            return False
+        writer.write(_message(b'R', struct.pack('!i', 0))
+                     + b''.join(self._backends[0].parameters)
+                     + _message(b'K', struct.pack('!ii', 0, 0))
+                     + _message(b'Z', b'I'))
+        return True
+
+    async def _relay(self, backend: _Backend,
+                     writer: asyncio.StreamWriter) -> None:
+        """Пересылает ответы сервера до конца транзакции."""
+        while True:
+            kind, body = await _read_message(backend.reader)
+            if not writer.is_closing():
+                writer.write(_message(kind, body))
+            if kind == b'Z' and body == b'I':
+                self._pool.put_nowait(backend)
+                return
+
+
+async def _run_connections(engine: AsyncEngine,
+                           connections: int) -> tuple[int, list[str]]:
+    """Открывает соединения по очереди; возвращает успехи и SQLSTATE ошибок."""
+    succeeded, failures = 0, []
+    for number in range(connections):
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(CHECK_QUERIES[0],
+                                         {'pages': number % 3})
+                await connection.execute(CHECK_QUERIES[1],
+                                         {'oid': 16 + number % 10})
+            succeeded += 1
+        except DBAPIError as exc:
+            failures.append(getattr(exc.orig, 'sqlstate', None) or '?')
+    return succeeded, failures
+
+
+async def run_check(backends: int, connections: int, port: int) -> bool:
+    """Прогоняет обычный режим и режим PgBouncer через прокси."""
+    backend_url = make_url(settings.database_direct_url
+                           or settings.database_url)
+    proxy_url = backend_url.difference_update_query(['host']).set(
+        host=PROXY_HOST, port=port
+    )
+    proxy = TransactionPoolingProxy(backend_url, backends)
+    await proxy.start(port)
+    # Без statement_timeout в server_settings: иначе обычный режим
+    # отклоняется ещё на стартовом параметре, а не на подготовленных
+    # запросах.
+    default_engine = create_async_engine(proxy_url, **engine_options(
+        dataclasses.replace(settings, db_pgbouncer=False, db_echo=False,
+                            db_statement_timeout_ms=0)
+    ))
+    pgbouncer_engine = create_async_engine(proxy_url, **engine_options(
+        dataclasses.replace(
+            settings, db_pgbouncer=True, db_echo=False,
+            database_direct_url=backend_url.render_as_string(
+                hide_password=False),
+        )
+    ))
+    try:
+        default = await _run_connections(default_engine, connections)
+        pgbouncer = await _run_connections(pgbouncer_engine, connections)
+    finally:
+        await default_engine.dispose()
+        await pgbouncer_engine.dispose()
+        await proxy.close()
+
+    for label, (succeeded, failures) in (('default', default),
+                                         ('pgbouncer', pgbouncer)):
+        print(f'{label}: {succeeded}/{connections} succeeded, '
+              f'failures by SQLSTATE {sorted(set(failures))}')
+    print(f'transactions through proxy: {proxy.transactions}')
+    return (bool(default[1])
+            and set(default[1]) == {INVALID_STATEMENT_NAME_SQLSTATE}
+            and pgbouncer[0] == connections)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', type=int, default=DEFAULT_BACKENDS,
+                        help='серверных соединений в пуле прокси')
+    parser.add_argument('--connections', type=int,
+                        default=DEFAULT_CONNECTIONS,
+                        help='соединений в каждом режиме')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    if not asyncio.run(run_check(args.backends, args.connections, args.port)):
+        print('FAILED: expected InvalidSQLStatementNameError (26000) '
+              'only in default mode and no errors with DB_PGBOUNCER=true')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
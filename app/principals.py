@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from app.database import async_listen_engine
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_TTL_SECONDS = 60
+PRINCIPAL_CACHE_SIZE = 10_000
+USER_CHANGED_CHANNEL = 'user_changed'
+RECONNECT_DELAY_SECONDS = 5
+
+
+class Principal(NamedTuple):
+    """Данные активного пользователя, нужные для авторизации запроса."""
+
+    id: int
+    email: str
+    role: str
+
+
+class PrincipalCache:
+    """LRU-кэш активных пользователей с ограниченным временем жизни.
+
+    Ключ — id пользователя из токена. Записи сбрасываются по
+    уведомлению user_changed (смена роли, email, блокировка, удаление).
+    Счётчик поколений не даёт запросу, читавшему базу до сброса,
+    положить в кэш уже устаревшие данные.
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_TTL_SECONDS,
+                 max_size: int = PRINCIPAL_CACHE_SIZE) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.generation = 0
+        self._entries: OrderedDict[int, tuple[float, Principal]] = (
+            OrderedDict()
+        )
+
+    def get(self, user_id: int) -> Principal | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return principal
+
+    def put(self, principal: Principal, generation: int) -> None:
+        """Кладёт запись, если с чтения из базы не было сбросов."""
+        if generation != self.generation:
+            return
+        self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+        self._entries.move_to_end(principal.id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self.generation += 1
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+def _on_user_changed(connection, pid: int, channel: str,
+                     payload: str) -> None:
+    principal_cache.invalidate(int(payload))
+
+
+async def run_principal_invalidation_listener() -> None:
+    """Фоновая задача: слушает user_changed и сбрасывает записи кэша.
+
+    Пока соединение потеряно, уведомления теряются, поэтому после
+    каждого переподключения кэш очищается целиком.
+    """
+    while True:
+        try:
+            async with async_listen_engine.connect() as connection:
+                raw = await connection.get_raw_connection()
+                driver = raw.driver_connection
+                closed = asyncio.Event()
+                driver.add_termination_listener(lambda _: closed.set())
+                await driver.add_listener(USER_CHANGED_CHANNEL,
+                                          _on_user_changed)
+                principal_cache.clear()
+                try:
+                    await closed.wait()
+                finally:
+                    if not driver.is_closed():
+                        await driver.remove_listener(USER_CHANGED_CHANNEL,
+                                                     _on_user_changed)
+            logger.warning('User change listener connection was lost')
+        except Exception:
+            logger.exception('User change listener failed')
+        principal_cache.clear()
+        await asyncio.sleep(RECONNECT_DELAY_SECONDS)
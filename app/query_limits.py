@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+QUERY_CANCELED_SQLSTATE = '57014'
+RETRY_AFTER_SECONDS = 5
+SAFE_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+_statement_timeout_ms: ContextVar[int | None] = ContextVar(
+    'statement_timeout_ms', default=None
+)
+
+
+def statement_timeout(milliseconds: int) -> Callable[[], Awaitable[None]]:
+    """Dependency: statement_timeout для всех транзакций запроса.
+
+    Подключается к роутеру через dependencies=[Depends(...)] и
+    действует на сессии, открытые этим запросом. Запрос к базе
+    дольше milliseconds сервер отменяет, и клиент получает 503 с
+    Retry-After (см. query_canceled_handler).
+    """
+    async def set_statement_timeout() -> None:
+        _statement_timeout_ms.set(milliseconds)
+    return set_statement_timeout
+
+
+@event.listens_for(Session, 'after_begin')
+def _apply_statement_timeout(session, transaction, connection) -> None:
+    milliseconds = _statement_timeout_ms.get()
+    if milliseconds is not None:
+        # SET LOCAL живёт до конца транзакции и годится для PgBouncer.
+        connection.execute(
+            text("SELECT set_config('statement_timeout', :value, true)"),
+            {'value': str(milliseconds)},
+        )
+
+
+def _service_unavailable(detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={'detail': detail},
+        headers={'Retry-After': str(RETRY_AFTER_SECONDS)},
+    )
+
+
+async def query_canceled_handler(request: Request,
+                                 exc: DBAPIError) -> JSONResponse:
+    """Запрос, прерванный по statement_timeout, — 503, а не 500."""
+    if getattr(exc.orig, 'sqlstate', None) != QUERY_CANCELED_SQLSTATE:
+        raise exc
+    logger.warning('Query canceled by statement_timeout: %s %s',
+                   request.method, request.url.path)
+    return _service_unavailable('Query took too long, try again later')
+
+
+async def pool_timeout_handler(request: Request,
+                               exc: PoolTimeoutError) -> JSONResponse:
+    """Пул соединений исчерпан дольше pool_timeout — тоже 503."""
+    logger.warning('Database pool exhausted: %s %s',
+                   request.method, request.url.path)
+    return _service_unavailable('Service is busy, try again later')
+
+
+class CancelOnDisconnectMiddleware:
+    """Отменяет обработку GET-запроса, если клиент отключился.
+
+    Отмена задачи прерывает и выполняющийся запрос к базе: asyncpg
+    отправляет серверу cancel, соединение возвращается в пул. Запросы
+    с изменениями доводятся до конца, чтобы не обрывать побочные
+    эффекты вне транзакции. После отправки ответа целиком отмены
+    нет: сервер тогда сразу сообщает http.disconnect, а BackgroundTasks
+    и завершение зависимостей ещё выполняются.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope['type'] != 'http' or scope['method'] not in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        response_sent = False
+
+        async def send_tracking(message: Message) -> None:
+            nonlocal response_sent
+            if (message['type'] == 'http.response.body'
+                    and not message.get('more_body', False)):
+                response_sent = True
+            await send(message)
+
+        handler = asyncio.create_task(
+            self.app(scope, messages.get, send_tracking)
+        )
+
+        async def watch_disconnect() -> None:
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message['type'] == 'http.disconnect':
+                    if not response_sent:
+                        handler.cancel()
+                    return
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not watcher.done():
+                raise
+            logger.info('Client disconnected, request canceled: %s',
+                        scope['path'])
+        finally:
+            watcher.cancel()
+            handler.cancel()
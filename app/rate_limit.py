@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import timedelta
+from typing import Protocol
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import LOGIN_RATE_LIMIT_BACKEND
+from app.database import async_session_maker
+from app.models.rate_limits import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+# С одного IP: всплеск до 30 попыток, затем одна попытка в 2 секунды.
+LOGIN_IP_CAPACITY = 30
+LOGIN_IP_REFILL_PER_SECOND = 0.5
+# На один логин: всплеск до 10 попыток, затем одна попытка в 30 секунд.
+LOGIN_USERNAME_CAPACITY = 10
+LOGIN_USERNAME_REFILL_PER_SECOND = 1 / 30
+MEMORY_MAX_KEYS = 100_000
+BUCKET_RETENTION = timedelta(days=1)
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class TokenBucket(Protocol):
+    """Набор token bucket по ключам."""
+
+    async def acquire(self, key: str) -> float:
+        """Забирает токен; 0 — разрешено, иначе секунды до следующего."""
+
+
+class MemoryTokenBucket:
+    """Token bucket в памяти воркера.
+
+    Проверка — несколько арифметических операций над dict, без
+    блокировок и ввода-вывода. Число ключей ограничено: при
+    переполнении вытесняется давно не использованный.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float,
+                 max_keys: int = MEMORY_MAX_KEYS) -> None:
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    async def acquire(self, key: str) -> float:
+        now = time.monotonic()
+        entry = self._buckets.pop(key, None)
+        if entry is None:
+            tokens = self.capacity
+        else:
+            tokens = min(self.capacity,
+                         entry[0] + (now - entry[1]) * self.refill_per_second)
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+        else:
+            retry_after = (1 - tokens) / self.refill_per_second
+        # Повторная вставка переносит ключ в конец: dict хранит порядок LRU.
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+        return retry_after
+
+
+class PostgresTokenBucket:
+    """Token bucket в таблице rate_limit_buckets, общий для всех воркеров.
+
+    Пополнение и списание — один атомарный upsert; запрос к базе
+    нужен только при отказе, чтобы вычислить Retry-After.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float) -> None:
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+
+    def _refilled(self):
+        elapsed = func.extract('epoch', func.now() - RateLimitBucket.updated_at)
+        return func.least(
+            self.capacity,
+            RateLimitBucket.tokens + elapsed * self.refill_per_second,
+        )
+
+    async def acquire(self, key: str) -> float:
+        refilled = self._refilled()
+        stmt = pg_insert(RateLimitBucket).values(
+            key=key, tokens=self.capacity - 1, updated_at=func.now()
+        )
+        async with async_session_maker() as session:
+            acquired = await session.scalar(
+                stmt.on_conflict_do_update(
+                    index_elements=[RateLimitBucket.key],
+                    set_={'tokens': refilled - 1, 'updated_at': func.now()},
+                    where=refilled >= 1,
+                ).returning(RateLimitBucket.key)
+            )
+            if acquired is not None:
+                await session.commit()
+                return 0.0
+            tokens = await session.scalar(
+                select(refilled).where(RateLimitBucket.key == key)
+            )
+            await session.rollback()
+        return (1 - (tokens or 0)) / self.refill_per_second
+
+    async def prune(self) -> int:
+        """Удаляет давно не обновлявшиеся (уже полные) счётчики."""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                delete(RateLimitBucket)
+                .where(RateLimitBucket.updated_at
+                       < func.now() - BUCKET_RETENTION)
+            )
+            await session.commit()
+            return result.rowcount
+
+
+class LoginRateLimiter:
+    """Ограничивает попытки входа по IP клиента и по логину."""
+
+    def __init__(self, by_ip: TokenBucket, by_username: TokenBucket) -> None:
+        self.by_ip = by_ip
+        self.by_username = by_username
+
+    async def check(self, client_ip: str | None, username: str) -> None:
+        """Пропускает попытку или выбрасывает 429 с Retry-After.
+
+        Вызывается до поиска пользователя и проверки пароля, чтобы
+        отклонённая попытка ничего не стоила базе и CPU.
+        """
+        retry_after = await self.by_ip.acquire(f'login:ip:{client_ip}')
+        if not retry_after:
+            retry_after = await self.by_username.acquire(
+                f'login:user:{username.strip().lower()}'
+            )
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail='Too many login attempts, try again later',
+                headers={'Retry-After': str(math.ceil(retry_after))},
+            )
+
+
+def _create_login_rate_limiter() -> LoginRateLimiter:
+    if LOGIN_RATE_LIMIT_BACKEND == 'postgres':
+        bucket = PostgresTokenBucket
+    elif LOGIN_RATE_LIMIT_BACKEND == 'memory':
+        bucket = MemoryTokenBucket
+    else:
+        raise ValueError(
+            f'Unknown LOGIN_RATE_LIMIT_BACKEND: {LOGIN_RATE_LIMIT_BACKEND}'
+        )
+    return LoginRateLimiter(
+        by_ip=bucket(LOGIN_IP_CAPACITY, LOGIN_IP_REFILL_PER_SECOND),
+        by_username=bucket(LOGIN_USERNAME_CAPACITY,
+                           LOGIN_USERNAME_REFILL_PER_SECOND),
+    )
+
+
+login_rate_limiter = _create_login_rate_limiter()
+
+
+async def run_rate_limit_pruner() -> None:
+    """Фоновая задача, чистящая общие счётчики в режиме postgres."""
+    buckets = [bucket for bucket in (login_rate_limiter.by_ip,
+                                     login_rate_limiter.by_username)
+               if isinstance(bucket, PostgresTokenBucket)]
+    if not buckets:
+        return
+    while True:
+        try:
+            await buckets[0].prune()
+        except Exception:
+            logger.exception('Rate limit bucket pruning failed')
+        await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
@@ -0,0 +1,81 @@
+import math
+import time
+from collections.abc import Awaitable, Callable
+
+import jwt
+from fastapi import Request, Response
+
+from app.config import ALGORITHM, SECRET_KEY
+from app.settings import settings
+
+PRIMARY_PIN_COOKIE = 'read_primary_until'
+PRIMARY_PIN_MAX_USERS = 100_000
+WRITE_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+
+
+def _request_user_id(request: Request) -> int | None:
+    """id пользователя из access-токена запроса, если он есть."""
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    if payload.get('token_type') != 'access':
+        return None
+    user_id = payload.get('id')
+    return user_id if isinstance(user_id, int) else None
+
+
+class PrimaryPins:
+    """Кто недавно писал и поэтому должен читать с primary.
+
+    Метка ставится и по id пользователя в памяти воркера, и cookie
+    в ответе: cookie переносит её на другие воркеры, а id — на
+    клиентов без cookie, попавших на тот же воркер.
+    """
+
+    def __init__(self, seconds: float = settings.read_your_writes_seconds,
+                 max_users: int = PRIMARY_PIN_MAX_USERS) -> None:
+        self.seconds = seconds
+        self.max_users = max_users
+        self._until: dict[int, float] = {}
+
+    def pin(self, request: Request, response: Response) -> None:
+        until = time.time() + self.seconds
+        user_id = _request_user_id(request)
+        if user_id is not None:
+            self._until.pop(user_id, None)
+            self._until[user_id] = until
+            if len(self._until) > self.max_users:
+                del self._until[next(iter(self._until))]
+        response.set_cookie(PRIMARY_PIN_COOKIE, str(math.ceil(until)),
+                            max_age=math.ceil(self.seconds),
+                            httponly=True, samesite='lax')
+
+    def is_pinned(self, request: Request) -> bool:
+        now = time.time()
+        try:
+            if float(request.cookies.get(PRIMARY_PIN_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        if not self._until:
+            return False
+        user_id = _request_user_id(request)
+        return user_id is not None and self._until.get(user_id, 0) > now
+
+
+primary_pins = PrimaryPins()
+
+
+async def pin_primary_after_write(
+        request: Request,
+        call_next: Callable[[Request], Awaitable[Response]],
+) -> Response:
+    """Middleware: после успешной записи закрепляет клиента за primary."""
+    response = await call_next(request)
+    if request.method in WRITE_METHODS and response.status_code < 400:
+        primary_pins.pin(request, response)
+    return response
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_maker
+from app.models.tokens import RefreshTokenFamily
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_EXPIRE_DAYS = 7
+REFRESH_TOKEN_LIFETIME = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+REVOCATION_SYNC_INTERVAL_SECONDS = 30
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+def new_token_id() -> str:
+    """Случайный идентификатор для jti и семейства токенов."""
+    return uuid.uuid4().hex
+
+
+class RevokedFamilies:
+    """Отозванные семейства refresh-токенов в памяти воркера.
+
+    Хранятся только отозванные и ещё не истёкшие семейства, поэтому
+    множество мало, а проверка «не отозван» обходится без базы.
+    Отзывы из других воркеров подтягиваются sync(); до этого
+    ротацию всё равно не пропустит условие в UPDATE.
+    """
+
+    def __init__(self) -> None:
+        self._ids: set[str] = set()
+        self._added: set[str] = set()
+
+    def __contains__(self, family_id: object) -> bool:
+        return family_id in self._ids
+
+    def add(self, family_id: str) -> None:
+        self._ids.add(family_id)
+        self._added.add(family_id)
+
+    async def sync(self) -> None:
+        """Перечитывает множество из таблицы refresh_token_families."""
+        self._added = set()
+        async with async_session_maker() as session:
+            result = await session.scalars(
+                select(RefreshTokenFamily.id)
+                .where(RefreshTokenFamily.revoked_at.is_not(None),
+                       RefreshTokenFamily.expires_at > func.now())
+            )
+            loaded = set(result)
+        # Отзывы, сделанные этим воркером во время чтения, не теряются.
+        self._ids = loaded | self._added
+
+
+revoked_families = RevokedFamilies()
+
+
+def start_family(db: AsyncSession, family_id: str, user_id: int,
+                 jti: str) -> None:
+    """Добавляет в сессию новое семейство с первым токеном jti."""
+    db.add(RefreshTokenFamily(
+        id=family_id,
+        user_id=user_id,
+        current_jti=jti,
+        expires_at=func.now() + REFRESH_TOKEN_LIFETIME,
+    ))
+
+
+async def rotate_family(db: AsyncSession, family_id: str, user_id: int,
+                        jti: str, new_jti: str) -> bool:
+    """Заменяет текущий токен семейства на new_jti и фиксирует это.
+
+    Замена — один условный UPDATE, поэтому из двух одновременных
+    запросов с одним токеном пройдёт только первый. Если jti уже не
+    текущий, токен предъявлен повторно: семейство отзывается целиком,
+    вместе с выданными по нему access-токенами. Возвращает False, если
+    ротация не удалась.
+    """
+    rotated = await db.scalar(
+        update(RefreshTokenFamily)
+        .where(RefreshTokenFamily.id == family_id,
+               RefreshTokenFamily.user_id == user_id,
+               RefreshTokenFamily.current_jti == jti,
+               RefreshTokenFamily.revoked_at.is_(None))
+        .values(current_jti=new_jti,
+                expires_at=func.now() + REFRESH_TOKEN_LIFETIME)
+        .returning(RefreshTokenFamily.id)
+    )
+    if rotated is not None:
+        await db.commit()
+        return True
+    revoked = await db.scalar(
+        update(RefreshTokenFamily)
+        .where(RefreshTokenFamily.id == family_id,
+               RefreshTokenFamily.revoked_at.is_(None))
+        .values(revoked_at=func.now())
+        .returning(RefreshTokenFamily.id)
+    )
+    await db.commit()
+    if revoked is not None:
+        logger.warning('Refresh token reuse detected, family %s revoked',
+                       family_id)
+    revoked_families.add(family_id)
+    return False
+
+
+async def prune_families() -> int:
+    """Удаляет семейства, все токены которых уже истекли."""
+    async with async_session_maker() as session:
+        result = await session.execute(
+            delete(RefreshTokenFamily)
+            .where(RefreshTokenFamily.expires_at < func.now())
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def run_revocation_sync() -> None:
+    """Фоновая задача: обновляет отозванные семейства и чистит истёкшие."""
+    loop = asyncio.get_running_loop()
+    next_prune = loop.time()
+    while True:
+        try:
+            await revoked_families.sync()
+            if loop.time() >= next_prune:
+                await prune_families()
+                next_prune = loop.time() + PRUNE_INTERVAL_SECONDS
+        except Exception:
+            logger.exception('Refresh token revocation sync failed')
+        await asyncio.sleep(REVOCATION_SYNC_INTERVAL_SECONDS)
@@ -1,9 +1,17 @@
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.outbox import add_outbox_event
+
 
 class BaseRepository[ModelType]:
-    """Базовый репозиторий для работы с моделями."""
+    """Базовый репозиторий для работы с моделями.
+
+    Если задан outbox_aggregate, создание, изменение и удаление записи
+    сопровождаются событием в outbox в той же транзакции.
+    """
+
+    outbox_aggregate: str | None = None
 
     def __init__(self, model: type[ModelType], db: AsyncSession) -> None:
         """Инициализирует репозиторий."""
@@ -28,19 +36,32 @@ class BaseRepository[ModelType]:
         """Создать запись."""
         instance = self.model(**data)
         self.db.add(instance)
+        if self.outbox_aggregate is not None:
+            await self.db.flush()
+            self._add_event('created', instance.id, data)
         await self.db.commit()
         await self.db.refresh(instance)
         return instance
 
-    async def update(self, id_data: int, data: dict) -> ModelType:
+    async def update(self, id_data: int, data: dict,
+                     event: str = 'updated') -> ModelType:
         """Обновить запись по id."""
         await self.db.execute(
             update(self.model)
             .where(self.model.id == id_data)
             .values(**data)
         )
+        self._add_event(event, id_data, data)
         await self.db.commit()
 
     async def soft_delete(self, id_data: int) -> ModelType:
         """Мягко удалить запись по id."""
-        await self.update(id_data, {"is_active": False})
+        await self.update(id_data, {"is_active": False}, event='deleted')
+
+    def _add_event(self, event: str, obj_id: int, data: dict) -> None:
+        """Записать событие об изменении записи в outbox."""
+        if self.outbox_aggregate is None:
+            return
+        add_outbox_event(self.db, self.outbox_aggregate, obj_id,
+                         f'{self.outbox_aggregate}.{event}',
+                         dict(data, id=obj_id))
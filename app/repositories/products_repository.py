@@ -10,6 +10,8 @@ from .base import BaseRepository
 class ProductsRepository(BaseRepository[Product]):
     """Репозиторий для работы с товарами."""
 
+    outbox_aggregate = 'product'
+
     def __init__(self, db: AsyncSession) -> None:
         """Инициализирует репозиторий товаров."""
         super().__init__(Product, db)
@@ -1,15 +1,21 @@
 from decimal import Decimal
 
-from sqlalchemy import func, select
+from sqlalchemy import (Integer, String, any_, bindparam, cast, false,
+                        func, literal, or_, select, update)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.models.products import Product
 from app.models.reviews import Review
+from app.outbox import insert_outbox_events
 from app.repositories.base import BaseRepository
 
 
 class ReviewsRepository(BaseRepository[Review]):
     """Репозиторий для работы с отзывами."""
 
+    outbox_aggregate = 'review'
+
     def __init__(self, db: AsyncSession) -> None:
         """Инициализация."""
         super().__init__(Review, db)
@@ -30,3 +36,66 @@ class ReviewsRepository(BaseRepository[Review]):
                    Review.is_active)
         )
         return Decimal(str(result)) if result else None
+
+    async def soft_delete_batch(
+            self, review_ids: list[int], user_id: int | None
+    ) -> tuple[int, list[int]]:
+        """Мягко удалить отзывы по списку id и/или автору.
+
+        Рейтинг каждого затронутого товара пересчитывается один раз
+        в той же транзакции. Возвращает число удалённых отзывов и
+        id затронутых товаров.
+        """
+        conditions = []
+        if review_ids:
+            conditions.append(Review.id == any_(
+                bindparam('review_ids', review_ids, type_=ARRAY(Integer))
+            ))
+        if user_id is not None:
+            conditions.append(Review.user_id == user_id)
+
+        changed = (
+            update(Review)
+            .where(Review.is_active, or_(*conditions))
+            .values(is_active=False)
+            .returning(Review.id, Review.product_id)
+            .cte('changed')
+        )
+        events = insert_outbox_events(select(
+            literal(self.outbox_aggregate), changed.c.id,
+            literal(f'{self.outbox_aggregate}.deleted'),
+            func.jsonb_build_object('is_active', false(),
+                                    'id', changed.c.id),
+        )).cte('events')
+        result = await self.db.execute(
+            select(changed.c.id, changed.c.product_id).add_cte(events)
+        )
+        deleted = result.tuples().all()
+        affected = sorted({product_id for _, product_id in deleted})
+        if affected:
+            await self._refresh_ratings(affected)
+        await self.db.commit()
+        return len(deleted), affected
+
+    async def _refresh_ratings(self, product_ids: list[int]) -> None:
+        """Пересчитать рейтинг товаров одним UPDATE вместе с событиями."""
+        avg_grade = (
+            select(func.avg(Review.grade))
+            .where(Review.product_id == Product.id, Review.is_active)
+            .scalar_subquery()
+        )
+        refreshed = (
+            update(Product)
+            .where(Product.id == any_(
+                bindparam('product_ids', product_ids, type_=ARRAY(Integer))
+            ))
+            .values(rating=func.coalesce(avg_grade, 0))
+            .returning(Product.id, Product.rating)
+            .cte('refreshed')
+        )
+        # Рейтинг в payload строкой, как Decimal в add_outbox_event.
+        await self.db.execute(insert_outbox_events(select(
+            literal('product'), refreshed.c.id, literal('product.updated'),
+            func.jsonb_build_object('id', refreshed.c.id, 'rating',
+                                    cast(refreshed.c.rating, String)),
+        )))
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlalchemy import (
+    Integer,
+    any_,
+    bindparam,
+    column,
+    delete,
+    func,
+    literal,
+    select,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_maker
+from app.models.products import Product
+from app.models.reservations import StockReservation
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_TTL = timedelta(minutes=15)
+SWEEP_INTERVAL_SECONDS = 60
+SWEEP_BATCH_SIZE = 1000
+
+
+def reserved_by_others(product_id, user_id: int):
+    """Скалярный подзапрос: активный резерв товара другими пользователями."""
+    return (
+        select(func.coalesce(func.sum(StockReservation.quantity), 0))
+        .where(StockReservation.product_id == product_id,
+               StockReservation.user_id != user_id,
+               StockReservation.expires_at > func.now())
+        .scalar_subquery()
+    )
+
+
+async def lock_products(db: AsyncSession, product_ids: list[int]) -> None:
+    """Блокирует строки товаров (FOR UPDATE) в порядке id.
+
+    Проверки «остаток минус чужие резервы» читают снимок на начало
+    запроса, поэтому без блокировки параллельные резервы и списания
+    одного товара видят одно и то же состояние. Под блокировкой
+    следующий запрос видит уже зафиксированные изменения предыдущего;
+    единый порядок исключает взаимоблокировки.
+    """
+    await db.execute(
+        select(Product.id)
+        .where(Product.id == any_(
+            bindparam('product_ids', product_ids, type_=ARRAY(Integer))
+        ))
+        .order_by(Product.id)
+        .with_for_update()
+    )
+
+
+async def reserve_stock(
+        db: AsyncSession, user_id: int, quantities: dict[int, int]
+) -> list[int]:
+    """Резервирует итоговые количества товаров одним upsert.
+
+    Резерв ставится или продлевается, только если остаток за вычетом
+    активных резервов других пользователей его покрывает; строки
+    товаров блокируются, чтобы параллельные резервы не превысили
+    остаток вместе. Возвращает id товаров, которые зарезервировать
+    не удалось.
+    """
+    if not quantities:
+        return []
+    await lock_products(db, sorted(quantities))
+    lines = values(
+        column('product_id', Integer), column('quantity', Integer),
+        name='lines',
+    ).data(list(quantities.items()))
+    stmt = pg_insert(StockReservation).from_select(
+        ['user_id', 'product_id', 'quantity', 'expires_at'],
+        select(literal(user_id), Product.id, lines.c.quantity,
+               func.now() + RESERVATION_TTL)
+        .join(lines, lines.c.product_id == Product.id)
+        .where(Product.is_active,
+               Product.stock - reserved_by_others(Product.id, user_id)
+               >= lines.c.quantity),
+    )
+    result = await db.scalars(
+        stmt.on_conflict_do_update(
+            index_elements=[StockReservation.user_id,
+                            StockReservation.product_id],
+            set_={
+                'quantity': stmt.excluded.quantity,
+                'expires_at': stmt.excluded.expires_at,
+            },
+        ).returning(StockReservation.product_id)
+    )
+    reserved = set(result)
+    return [product_id for product_id in quantities
+            if product_id not in reserved]
+
+
+async def release_stock(
+        db: AsyncSession, user_id: int, product_ids: list[int] | None = None
+) -> None:
+    """Снимает резервы пользователя (все или по списку товаров)."""
+    stmt = delete(StockReservation).where(StockReservation.user_id == user_id)
+    if product_ids is not None:
+        stmt = stmt.where(StockReservation.product_id == any_(
+            bindparam('product_ids', product_ids, type_=ARRAY(Integer))
+        ))
+    await db.execute(stmt)
+
+
+async def sweep_expired_reservations() -> int:
+    """Удаляет истёкшие резервы пачками и возвращает их количество.
+
+    Истёкшие резервы уже не учитываются в доступном остатке, чистка
+    только не даёт таблице и индексам разрастаться.
+    """
+    total = 0
+    async with async_session_maker() as session:
+        while True:
+            expired = (
+                select(StockReservation.id)
+                .where(StockReservation.expires_at <= func.now())
+                .order_by(StockReservation.expires_at)
+                .limit(SWEEP_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            result = await session.execute(
+                delete(StockReservation)
+                .where(StockReservation.id.in_(expired.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            total += result.rowcount
+            if result.rowcount < SWEEP_BATCH_SIZE:
+                return total
+
+
+async def run_reservation_sweeper() -> None:
+    """Фоновая задача, периодически освобождающая истёкшие резервы."""
+    while True:
+        try:
+            released = await sweep_expired_reservations()
+            if released:
+                logger.info('Released %s expired reservations', released)
+        except Exception:
+            logger.exception('Reservation sweep failed')
+        await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
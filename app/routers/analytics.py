@@ -0,0 +1,132 @@
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import get_current_admin, get_current_user
+from app.db_depends import get_async_db
+from app.models.sales import DailySales as DailySalesModel
+from app.models.users import User as UserModel
+from app.query_limits import statement_timeout
+from app.schemas import (
+    DailySalesReport,
+    ProductSalesReport,
+    SellerSalesReport,
+)
+
+STATEMENT_TIMEOUT_MS = 15_000
+
+router = APIRouter(
+    prefix='/analytics',
+    tags=['analytics'],
+    dependencies=[Depends(statement_timeout(STATEMENT_TIMEOUT_MS))],
+)
+
+DEFAULT_PERIOD_DAYS = 30
+
+_totals = (
+    func.sum(DailySalesModel.order_lines).label('order_lines'),
+    func.sum(DailySalesModel.units_sold).label('units_sold'),
+    func.sum(DailySalesModel.revenue).label('revenue'),
+)
+
+
+def _sales_conditions(
+        current_user: UserModel,
+        seller_id: int | None,
+        date_from: date | None,
+        date_to: date | None,
+) -> list:
+    """Условия выборки по сводке: период и видимость для роли."""
+    date_to = date_to or datetime.now(timezone.utc).date()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_PERIOD_DAYS)
+    if date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='date_from cannot be after date_to'
+        )
+    conditions = [DailySalesModel.day >= date_from,
+                  DailySalesModel.day <= date_to]
+
+    if current_user.role == 'seller':
+        if seller_id is not None and seller_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail='Sellers can only view their own sales'
+            )
+        conditions.append(DailySalesModel.seller_id == current_user.id)
+    elif current_user.role == 'admin':
+        if seller_id is not None:
+            conditions.append(DailySalesModel.seller_id == seller_id)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Only sellers and admins can view sales analytics'
+        )
+    return conditions
+
+
+@router.get('/sales/daily', response_model=list[DailySalesReport])
+async def get_daily_sales(
+        seller_id: int | None = Query(None, description='ID продавца'),
+        product_id: int | None = Query(None, description='ID товара'),
+        date_from: date | None = Query(None, description='С даты'),
+        date_to: date | None = Query(None, description='По дату'),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+        current_user: UserModel = Depends(get_current_user),
+) -> list[DailySalesReport]:
+    """Возвращает продажи по дням из предрассчитанной сводки."""
+    conditions = _sales_conditions(current_user, seller_id,
+                                   date_from, date_to)
+    if product_id is not None:
+        conditions.append(DailySalesModel.product_id == product_id)
+    result = await db.execute(
+        select(DailySalesModel.day, *_totals)
+        .where(*conditions)
+        .group_by(DailySalesModel.day)
+        .order_by(DailySalesModel.day)
+    )
+    return [DailySalesReport.model_validate(row) for row in result]
+
+
+@router.get('/sales/products', response_model=list[ProductSalesReport])
+async def get_product_sales(
+        seller_id: int | None = Query(None, description='ID продавца'),
+        date_from: date | None = Query(None, description='С даты'),
+        date_to: date | None = Query(None, description='По дату'),
+        limit: int = Query(50, ge=1, le=500),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+        current_user: UserModel = Depends(get_current_user),
+) -> list[ProductSalesReport]:
+    """Возвращает товары с наибольшей выручкой за период."""
+    conditions = _sales_conditions(current_user, seller_id,
+                                   date_from, date_to)
+    result = await db.execute(
+        select(DailySalesModel.product_id, *_totals)
+        .where(*conditions)
+        .group_by(DailySalesModel.product_id)
+        .order_by(func.sum(DailySalesModel.revenue).desc())
+        .limit(limit)
+    )
+    return [ProductSalesReport.model_validate(row) for row in result]
+
+
+@router.get('/sales/sellers', response_model=list[SellerSalesReport])
+async def get_seller_sales(
+        date_from: date | None = Query(None, description='С даты'),
+        date_to: date | None = Query(None, description='По дату'),
+        limit: int = Query(50, ge=1, le=500),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+        current_user: UserModel = Depends(get_current_admin),
+) -> list[SellerSalesReport]:
+    """Возвращает продавцов с наибольшей выручкой за период (админ)."""
+    conditions = _sales_conditions(current_user, None, date_from, date_to)
+    result = await db.execute(
+        select(DailySalesModel.seller_id, *_totals)
+        .where(*conditions)
+        .group_by(DailySalesModel.seller_id)
+        .order_by(func.sum(DailySalesModel.revenue).desc())
+        .limit(limit)
+    )
+    return [SellerSalesReport.model_validate(row) for row in result]
@@ -1,19 +1,43 @@
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from sqlalchemy import delete, select
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy import (
+    Integer,
+    any_,
+    bindparam,
+    case,
+    delete,
+    exists,
+    func,
+    literal,
+    column,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from app.auth import get_current_user
+from app.auth import (
+    GUEST_CART_MAX_ITEMS,
+    create_guest_cart_token,
+    decode_guest_cart_token,
+    get_current_user,
+)
 from app.db_depends import get_async_db
 from app.models.cart_items import CartItem as CartItemModel
 from app.models.products import Product as ProductModel
 from app.models.users import User as UserModel
+from app.reservations import release_stock, reserve_stock
 from app.schemas import (
     Cart as CartSchema,
+    CartBatchOperation,
+    CartBatchUpdate,
     CartItem as CartItemSchema,
     CartItemCreate,
     CartItemUpdate,
+    CartSummary,
+    GuestCart as GuestCartSchema,
+    GuestCartItem as GuestCartItemSchema,
 )
 
 router = APIRouter(
@@ -34,111 +58,428 @@ async def _ensure_product_available(db: AsyncSession, product_id: int) -> None:
         )
 
 
-async def _get_cart_item(
-        db: AsyncSession, user_id: int, product_id: int
-) -> CartItemModel | None:
-    result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == user_id,
-               CartItemModel.product_id == product_id,)
+def _upsert_cart_item(user_id: int, product_id: int, quantity: int):
+    """INSERT ... ON CONFLICT, вставляющий строку только для активного товара.
+
+    Повторные клики по одному товару увеличивают количество вместо
+    нарушения ограничения unique_cart_item.
+    """
+    stmt = pg_insert(CartItemModel).from_select(
+        ['user_id', 'product_id', 'quantity'],
+        select(
+            literal(user_id), ProductModel.id, literal(quantity)
+        ).where(ProductModel.id == product_id, ProductModel.is_active),
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[CartItemModel.user_id, CartItemModel.product_id],
+        set_={
+            'quantity': CartItemModel.quantity + stmt.excluded.quantity,
+            'updated_at': func.now(),
+        },
+    )
+
+
+async def _execute_returning_item(
+        db: AsyncSession, stmt
+) -> CartItemSchema | None:
+    """Выполняет изменение позиции и возвращает её вместе с товаром.
+
+    Изменяющий запрос оборачивается в CTE и соединяется с products,
+    поэтому вся операция занимает один запрос к базе.
+    """
+    changed = stmt.returning(
+        CartItemModel.id, CartItemModel.product_id, CartItemModel.quantity
+    ).cte('changed')
+    result = await db.execute(
+        select(changed.c.id, changed.c.quantity, ProductModel)
+        .join(ProductModel, ProductModel.id == changed.c.product_id)
     )
-    return result.first()
+    row = result.first()
+    if row is None:
+        return None
+    return CartItemSchema(id=row.id, quantity=row.quantity,
+                          product=row.Product)
+
+
+async def _load_cart(db: AsyncSession, user_id: int) -> CartSchema:
+    """Загружает позиции корзины и итоги одним запросом."""
+    line_price = CartItemModel.quantity * ProductModel.price
+    result = await db.execute(
+        select(
+            CartItemModel.id,
+            CartItemModel.quantity,
+            ProductModel,
+            func.sum(CartItemModel.quantity).over().label('total_quantity'),
+            func.sum(line_price).over().label('total_price'),
+        )
+        .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+        .where(CartItemModel.user_id == user_id)
+        .order_by(CartItemModel.id)
+    )
+    rows = result.all()
+
+    return CartSchema(
+        user_id=user_id,
+        items=[
+            CartItemSchema(id=row.id, quantity=row.quantity,
+                           product=row.Product)
+            for row in rows
+        ],
+        total_quantity=rows[0].total_quantity if rows else 0,
+        total_price=rows[0].total_price if rows else Decimal('0'),
+    )
+
+
+def _merge_batch_operations(
+        operations: list[CartBatchOperation]
+) -> dict[int, tuple[str, int]]:
+    """Сворачивает операции по одному товару в одно итоговое действие.
+
+    Один товар может встречаться в пакете несколько раз, а upsert
+    не может изменить одну строку дважды.
+    """
+    merged: dict[int, tuple[str, int]] = {}
+    for op in operations:
+        prev_action, prev_quantity = merged.get(op.product_id, (None, 0))
+        if op.action == 'increment' and prev_action == 'increment':
+            merged[op.product_id] = ('increment', prev_quantity + op.quantity)
+        elif op.action == 'increment' and prev_action == 'set':
+            merged[op.product_id] = ('set', prev_quantity + op.quantity)
+        elif op.action == 'increment' and prev_action == 'remove':
+            merged[op.product_id] = ('set', op.quantity)
+        else:
+            merged[op.product_id] = (op.action, op.quantity)
+    return merged
+
+
+async def _reserve_or_409(
+        db: AsyncSession, user_id: int, quantities: dict[int, int]
+) -> None:
+    """Резервирует остаток под позиции корзины или откатывает изменение."""
+    failed = await reserve_stock(db, user_id, quantities)
+    if failed:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f'Not enough stock for products: {failed}',
+        )
+
 
 @router.get('/', response_model=CartSchema)
 async def get_cart(
-        db: AsyncSession = Depends(get_async_db),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
         current_user: UserModel = Depends(get_current_user),
 ) -> CartSchema:
-    result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == current_user.id)
-        .order_by(CartItemModel.id)
-    )
-    items = result.all()
+    return await _load_cart(db, current_user.id)
 
-    total_quantity = sum(item.quantity for item in items)
-    price_items = (
-        Decimal(item.quantity) *
-        (item.product.price if item.product.price is not None else Decimal('0'))
-        for item in items
-    )
-    total_price_decimal = sum(price_items, Decimal('0'))
-    return CartSchema(
-        user_id=current_user.id,
-        items=items,
-        total_quantity=total_quantity,
-        total_price=total_price_decimal,
+@router.get('/summary', response_model=CartSummary)
+async def get_cart_summary(
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+        current_user: UserModel = Depends(get_current_user),
+) -> CartSummary:
+    result = await db.execute(
+        select(
+            func.coalesce(func.sum(CartItemModel.quantity), 0)
+            .label('total_quantity'),
+            func.coalesce(
+                func.sum(CartItemModel.quantity * ProductModel.price), 0
+            ).label('total_price'),
+        )
+        .select_from(CartItemModel)
+        .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+        .where(CartItemModel.user_id == current_user.id)
     )
+    row = result.one()
+    return CartSummary(total_quantity=row.total_quantity,
+                       total_price=row.total_price)
 
 @router.post('/items', response_model=CartItemSchema,
              status_code=status.HTTP_201_CREATED)
 async def add_item_to_cart(
         payload: CartItemCreate,
-        db: AsyncSession = Depends(get_async_db),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
         current_user: UserModel = Depends(get_current_user),
 ) -> CartItemSchema:
-    await _ensure_product_available(db, product_id=payload.product_id)
-
-    cart_item = await _get_cart_item(db, user_id=current_user.id, product_id=payload.product_id)
-    if cart_item:
-        cart_item.quantity += payload.quantity
-    else:
-        cart_item = CartItemModel(
-            user_id=current_user.id,
-            product_id=payload.product_id,
-            quantity=payload.quantity,
+    cart_item = await _execute_returning_item(
+        db, _upsert_cart_item(current_user.id, payload.product_id,
+                              payload.quantity)
+    )
+    if cart_item is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Product not found',
+        )
+    await _reserve_or_409(db, current_user.id,
+                          {payload.product_id: cart_item.quantity})
+    await db.commit()
+    return cart_item
+
+@router.put('/items/batch', response_model=CartSchema)
+async def batch_update_cart(
+        payload: CartBatchUpdate,
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+        current_user: UserModel = Depends(get_current_user),
+) -> CartSchema:
+    merged = _merge_batch_operations(payload.items)
+    remove_ids = [pid for pid, (action, _) in merged.items()
+                  if action == 'remove']
+    upsert_ids = [pid for pid, (action, _) in merged.items()
+                  if action != 'remove']
+    set_ids = [pid for pid, (action, _) in merged.items() if action == 'set']
+
+    if upsert_ids:
+        available = set(await db.scalars(
+            select(ProductModel.id).where(
+                ProductModel.id == any_(
+                    bindparam('ids', upsert_ids, type_=ARRAY(Integer))
+                ),
+                ProductModel.is_active,
+            )
+        ))
+        missing = [pid for pid in upsert_ids if pid not in available]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'Products not found: {missing}',
+            )
+
+    if remove_ids:
+        await db.execute(
+            delete(CartItemModel)
+            .where(CartItemModel.user_id == current_user.id,
+                   CartItemModel.product_id == any_(
+                       bindparam('remove_ids', remove_ids,
+                                 type_=ARRAY(Integer))
+                   ))
         )
-        db.add(cart_item)
+        await release_stock(db, current_user.id, remove_ids)
+
+    if upsert_ids:
+        stmt = pg_insert(CartItemModel).values([
+            {'user_id': current_user.id, 'product_id': pid,
+             'quantity': merged[pid][1]}
+            for pid in upsert_ids
+        ])
+        result = await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[CartItemModel.user_id,
+                                CartItemModel.product_id],
+                set_={
+                    'quantity': case(
+                        (stmt.excluded.product_id == any_(
+                            bindparam('set_ids', set_ids,
+                                      type_=ARRAY(Integer))
+                        ), stmt.excluded.quantity),
+                        else_=CartItemModel.quantity
+                        + stmt.excluded.quantity,
+                    ),
+                    'updated_at': func.now(),
+                },
+            ).returning(CartItemModel.product_id, CartItemModel.quantity)
+        )
+        await _reserve_or_409(db, current_user.id,
+                              dict(result.tuples().all()))
 
     await db.commit()
-    update_item = await _get_cart_item(db, current_user.id, payload.product_id)
-    return update_item
+    return await _load_cart(db, current_user.id)
 
 @router.put('/items/{product_id}', response_model=CartItemSchema)
 async def update_cart_item(
         product_id: int,
         payload: CartItemUpdate,
-        db: AsyncSession = Depends(get_async_db),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
         current_user: UserModel = Depends(get_current_user),
 ) -> CartItemSchema:
-    await _ensure_product_available(db, product_id=product_id)
-
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
+    cart_item = await _execute_returning_item(
+        db,
+        update(CartItemModel)
+        .where(
+            CartItemModel.user_id == current_user.id,
+            CartItemModel.product_id == product_id,
+            exists().where(ProductModel.id == product_id,
+                           ProductModel.is_active),
+        )
+        .values(quantity=payload.quantity)
+    )
+    if cart_item is None:
+        await _ensure_product_available(db, product_id=product_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Cart item not found',
         )
-
-    cart_item.quantity = payload.quantity
+    await _reserve_or_409(db, current_user.id, {product_id: payload.quantity})
     await db.commit()
-    update_item = await _get_cart_item(db, current_user.id, product_id)
-    return update_item
+    return cart_item
 
 @router.delete('/items/{product_id}', status_code=status.HTTP_204_NO_CONTENT)
 async def remove_item_from_cart(
         product_id: int,
-        db: AsyncSession = Depends(get_async_db),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
         current_user: UserModel = Depends(get_current_user),
 ) -> Response:
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
+    removed = await db.scalar(
+        delete(CartItemModel)
+        .where(CartItemModel.user_id == current_user.id,
+               CartItemModel.product_id == product_id)
+        .returning(CartItemModel.id)
+    )
+    if removed is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Cart item not found',
         )
-    await db.delete(cart_item)
+    await release_stock(db, current_user.id, [product_id])
     await db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.delete('/', status_code=status.HTTP_204_NO_CONTENT)
 async def clear_cart(
-        db: AsyncSession = Depends(get_async_db),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
         current_user: UserModel = Depends(get_current_user)
 ) -> Response:
     await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
+    await release_stock(db, current_user.id)
     await db.commit()
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+async def _price_guest_cart(
+        db: AsyncSession, items: dict[int, int]
+) -> GuestCartSchema:
+    """Оценивает гостевую корзину одним запросом к products.
+
+    Неактивные и удалённые товары выбрасываются из корзины и из
+    выданного заново токена.
+    """
+    products = {}
+    if items:
+        result = await db.scalars(
+            select(ProductModel).where(
+                ProductModel.id == any_(
+                    bindparam('ids', list(items), type_=ARRAY(Integer))
+                ),
+                ProductModel.is_active,
+            )
+        )
+        products = {product.id: product for product in result}
+
+    available = {product_id: quantity
+                 for product_id, quantity in items.items()
+                 if product_id in products}
+    return GuestCartSchema(
+        token=create_guest_cart_token(available),
+        items=[
+            GuestCartItemSchema(quantity=quantity,
+                                product=products[product_id])
+            for product_id, quantity in available.items()
+        ],
+        total_quantity=sum(available.values()),
+        total_price=sum(
+            (products[product_id].price * quantity
+             for product_id, quantity in available.items()),
+            Decimal('0'),
+        ),
+    )
+
+
+async def merge_guest_cart(
+        db: AsyncSession, user_id: int, guest_cart_token: str | None
+) -> None:
+    """Переносит гостевую корзину в cart_item пользователя одним upsert.
+
+    Количество суммируется с уже лежащими в корзине товарами,
+    неактивные товары пропускаются. Резерв ставится там, где хватает
+    остатка; нехватка не мешает входу и проявится при оформлении заказа.
+    Коммит остаётся за вызывающим.
+    """
+    try:
+        items = decode_guest_cart_token(guest_cart_token)
+    except HTTPException:
+        return
+    if not items:
+        return
+
+    guest_items = values(
+        column('product_id', Integer), column('quantity', Integer),
+        name='guest_items',
+    ).data(list(items.items()))
+    stmt = pg_insert(CartItemModel).from_select(
+        ['user_id', 'product_id', 'quantity'],
+        select(literal(user_id), ProductModel.id, guest_items.c.quantity)
+        .join(guest_items, guest_items.c.product_id == ProductModel.id)
+        .where(ProductModel.is_active),
+    )
+    result = await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[CartItemModel.user_id, CartItemModel.product_id],
+            set_={
+                'quantity': CartItemModel.quantity + stmt.excluded.quantity,
+                'updated_at': func.now(),
+            },
+        ).returning(CartItemModel.product_id, CartItemModel.quantity)
+    )
+    await reserve_stock(db, user_id, dict(result.tuples().all()))
+
+
+@router.get('/guest', response_model=GuestCartSchema)
+async def get_guest_cart(
+        guest_cart_token: str | None = Header(None, alias='X-Guest-Cart'),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+) -> GuestCartSchema:
+    items = decode_guest_cart_token(guest_cart_token)
+    return await _price_guest_cart(db, items)
+
+@router.post('/guest/items', response_model=GuestCartSchema)
+async def add_item_to_guest_cart(
+        payload: CartItemCreate,
+        guest_cart_token: str | None = Header(None, alias='X-Guest-Cart'),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+) -> GuestCartSchema:
+    items = decode_guest_cart_token(guest_cart_token)
+    if (payload.product_id not in items
+            and len(items) >= GUEST_CART_MAX_ITEMS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Guest cart is full',
+        )
+    items[payload.product_id] = (
+        items.get(payload.product_id, 0) + payload.quantity
+    )
+    cart = await _price_guest_cart(db, items)
+    if not any(item.product.id == payload.product_id for item in cart.items):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Product not found',
+        )
+    return cart
+
+@router.put('/guest/items/{product_id}', response_model=GuestCartSchema)
+async def update_guest_cart_item(
+        product_id: int,
+        payload: CartItemUpdate,
+        guest_cart_token: str | None = Header(None, alias='X-Guest-Cart'),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+) -> GuestCartSchema:
+    items = decode_guest_cart_token(guest_cart_token)
+    if product_id not in items:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Cart item not found',
+        )
+    items[product_id] = payload.quantity
+    return await _price_guest_cart(db, items)
+
+@router.delete('/guest/items/{product_id}', response_model=GuestCartSchema)
+async def remove_item_from_guest_cart(
+        product_id: int,
+        guest_cart_token: str | None = Header(None, alias='X-Guest-Cart'),
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+) -> GuestCartSchema:
+    items = decode_guest_cart_token(guest_cart_token)
+    if items.pop(product_id, None) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Cart item not found',
+        )
+    return await _price_guest_cart(db, items)
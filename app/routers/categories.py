@@ -1,19 +1,23 @@
 from fastapi import APIRouter, Depends, status
 
-from app.db_depends import get_category_service
+from app.db_depends import get_category_read_service, get_category_service
+from app.query_limits import statement_timeout
 from app.schemas import Category as CategorySchema
 from app.schemas import CategoryCreate
 from app.services.category_service import CategoryService
 
+STATEMENT_TIMEOUT_MS = 3000
+
 router = APIRouter(
     prefix='/categories',
     tags=['categories'],
+    dependencies=[Depends(statement_timeout(STATEMENT_TIMEOUT_MS))],
 )
 
 
 @router.get('/', response_model=list[CategorySchema])
 async def get_all_categories(
-        service: CategoryService = Depends(get_category_service)
+        service: CategoryService = Depends(get_category_read_service)
 ) -> list[CategorySchema]:
     """Возвращает список всех активных категорий."""
     return await service.get_all_categories()
@@ -1,22 +1,82 @@
+import asyncio
+import base64
+import json
+from datetime import datetime
 from decimal import Decimal
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import delete, func, select
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    WebSocket,
+    status,
+)
+from sqlalchemy import (
+    Date,
+    Integer,
+    and_,
+    cast,
+    column,
+    delete,
+    exists,
+    func,
+    insert,
+    select,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.auth import get_current_user
+from app.auth import get_current_seller, get_current_user, get_user_by_token
+from app.database import async_session_maker
 from app.db_depends import get_async_db
 from app.models.cart_items import CartItem as CartItemModel
-from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
+from app.models.orders import (
+    Order as OrderModel,
+    OrderIdempotencyKey as OrderIdempotencyKeyModel,
+    OrderItem as OrderItemModel,
+)
+from app.models.products import Product as ProductModel
+from app.models.sales import DailySales as DailySalesModel
 from app.models.users import User as UserModel
-from app.schemas import Order as OrderSchema, OrderList, CartItemBase
+from app.order_events import notify_order_status, order_status_broker
+from app.outbox import add_outbox_event
+from app.reservations import (
+    lock_products,
+    release_stock,
+    reserved_by_others,
+)
+from app.schemas import (
+    Order as OrderSchema,
+    OrderList,
+    OrderStatusUpdate,
+    OrderSummary,
+    OrderSummaryList,
+    SellerOrderFeed,
+    SellerOrderItem,
+    CartItemBase,
+)
 
 router = APIRouter(
     prefix="/orders",
     tags=["orders"],
 )
 
+ORDER_STATUS_TRANSITIONS = {
+    'pending': {'paid', 'cancelled'},
+    'paid': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+SELLER_ORDER_STATUSES = {'shipped', 'delivered'}
+
 
 
 async def _load_order_with_items(
@@ -33,73 +93,196 @@ async def _load_order_with_items(
     return result.first()
 
 
+async def _load_order_by_idempotency_key(
+        db: AsyncSession, user_id: int, idempotency_key: str
+) -> OrderModel | None:
+    order_id = await db.scalar(
+        select(OrderIdempotencyKeyModel.order_id)
+        .where(OrderIdempotencyKeyModel.user_id == user_id,
+               OrderIdempotencyKeyModel.key == idempotency_key)
+    )
+    if order_id is None:
+        return None
+    return await _load_order_with_items(db, order_id)
+
+
+async def _record_daily_sales(
+        db: AsyncSession, order_items: list[dict]
+) -> None:
+    """Добавляет позиции заказа в дневную сводку продаж одним upsert."""
+    sales_day = cast(func.timezone('UTC', func.now()), Date)
+    stmt = pg_insert(DailySalesModel).values([
+        {
+            'day': sales_day,
+            'seller_id': item['seller_id'],
+            'product_id': item['product_id'],
+            'order_lines': 1,
+            'units_sold': item['quantity'],
+            'revenue': item['total_price'],
+        }
+        for item in order_items
+    ])
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DailySalesModel.day, DailySalesModel.seller_id,
+                            DailySalesModel.product_id],
+            set_={
+                'order_lines': DailySalesModel.order_lines
+                + stmt.excluded.order_lines,
+                'units_sold': DailySalesModel.units_sold
+                + stmt.excluded.units_sold,
+                'revenue': DailySalesModel.revenue + stmt.excluded.revenue,
+            },
+        )
+    )
+
+
+async def _raise_checkout_failure(
+        db: AsyncSession, product_id: int
+) -> None:
+    """Объясняет, почему позиция не прошла условное списание остатка."""
+    product = await db.scalar(
+        select(ProductModel).where(ProductModel.id == product_id)
+    )
+    if not product or not product.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Product {product_id} is unavailable'
+        )
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f'Not enough stock for product {product.name}'
+    )
+
+
 @router.post('/checkout', response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
 async def checkout_order(
-    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: str | None = Header(
+        None, alias='Idempotency-Key', max_length=64
+    ),
+    db: AsyncSession = Depends(get_async_db, scope='function'),
     current_user: UserModel = Depends(get_current_user),
 ):
     """
     Создаёт заказ на основе текущей корзины пользователя.
-    Сохраняет позиции заказа, вычитает остатки и очищает корзину.
+
+    Корзина забирается одним DELETE ... RETURNING, строки товаров
+    блокируются, остатки всех позиций списываются одним условным UPDATE
+    (остаток за вычетом чужих резервов не меньше количества), позиции
+    заказа вставляются одним многострочным INSERT. Если хотя бы одна
+    позиция не списалась, транзакция откатывается целиком.
+
+    С заголовком Idempotency-Key повторный запрос возвращает уже
+    созданный заказ вместо повторного оформления.
     """
-    cart_result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == current_user.id)
-        .order_by(CartItemModel.id)
-    )
-    cart_items = cart_result.all()
-    if not cart_items:
+    user_id = current_user.id
+    if idempotency_key:
+        existing_order = await _load_order_by_idempotency_key(
+            db, user_id, idempotency_key
+        )
+        if existing_order:
+            return existing_order
+
+    cart_result = await db.execute(
+        delete(CartItemModel)
+        .where(CartItemModel.user_id == user_id)
+        .returning(CartItemModel.product_id, CartItemModel.quantity)
+        .execution_options(synchronize_session=False)
+    )
+    cart_lines = sorted(cart_result.tuples().all())
+    if not cart_lines:
+        if idempotency_key:
+            # Параллельный повтор мог оформить заказ, пока мы ждали корзину.
+            await db.rollback()
+            existing_order = await _load_order_by_idempotency_key(
+                db, user_id, idempotency_key
+            )
+            if existing_order:
+                return existing_order
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Cart is empty'
         )
 
-    order = OrderModel(user_id=current_user.id)
-    total_amount = 0
-
-    for cart_item in cart_items:
-        product = cart_item.product
-        if not product or not product.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f'Product {cart_item.product_id} is unavailable'
-            )
-
-        if product.stock < cart_item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f'Not enough stock for product {product.name}'
-            )
-
-        unit_price = product.price
-        if unit_price is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f'Product {product.name} has no price set'
-            )
-        total_price = unit_price * cart_item.quantity
-        total_amount += total_price
+    # Иначе UPDATE, дождавшийся чужого списания, сверил бы остаток
+    # с резервами из старого снимка.
+    await lock_products(db, [product_id for product_id, _ in cart_lines])
+    lines = values(
+        column('product_id', Integer), column('quantity', Integer),
+        name='lines',
+    ).data(cart_lines)
+    stock_result = await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == lines.c.product_id,
+               ProductModel.is_active,
+               ProductModel.stock
+               - reserved_by_others(ProductModel.id, user_id)
+               >= lines.c.quantity)
+        .values(stock=ProductModel.stock - lines.c.quantity)
+        .returning(ProductModel.id, ProductModel.price,
+                   ProductModel.seller_id, ProductModel.stock)
+        .execution_options(synchronize_session=False)
+    )
+    products = {product_id: (price, seller_id, stock)
+                for product_id, price, seller_id, stock
+                in stock_result.tuples()}
+    if len(products) < len(cart_lines):
+        await db.rollback()
+        failed_id = next(product_id for product_id, _ in cart_lines
+                         if product_id not in products)
+        await _raise_checkout_failure(db, failed_id)
 
-        order_item = OrderItemModel(
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            unit_price=unit_price,
-            total_price=total_price
+    order_items = [
+        {
+            'product_id': product_id,
+            'seller_id': products[product_id][1],
+            'quantity': quantity,
+            'unit_price': products[product_id][0],
+            'total_price': products[product_id][0] * quantity,
+        }
+        for product_id, quantity in cart_lines
+    ]
+    total_amount = sum(
+        (item['total_price'] for item in order_items), Decimal('0')
+    )
+    order_id, created_at = (await db.execute(
+        insert(OrderModel)
+        .values(user_id=user_id, total_amount=total_amount)
+        .returning(OrderModel.id, OrderModel.created_at)
+    )).one()
+    if idempotency_key:
+        claimed = await db.scalar(
+            pg_insert(OrderIdempotencyKeyModel)
+            .values(user_id=user_id, key=idempotency_key, order_id=order_id)
+            .on_conflict_do_nothing()
+            .returning(OrderIdempotencyKeyModel.order_id)
         )
-        order.items.append(order_item)
-        product.stock -=cart_item.quantity
-
-    order.total_amount = total_amount
-    db.add(order)
-
+        if claimed is None:
+            await db.rollback()
+            return await _load_order_by_idempotency_key(
+                db, user_id, idempotency_key
+            )
     await db.execute(
-        delete(CartItemModel)
-        .where(CartItemModel.user_id == current_user.id)
+        insert(OrderItemModel).values(
+            [dict(item, order_id=order_id, created_at=created_at)
+             for item in order_items]
+        )
     )
+    await _record_daily_sales(db, order_items)
+    await release_stock(db, user_id)
+    add_outbox_event(db, 'order', order_id, 'order.created', {
+        'id': order_id,
+        'user_id': user_id,
+        'status': 'pending',
+        'total_amount': total_amount,
+        'items': order_items,
+    })
+    for product_id, (_, _, stock) in products.items():
+        add_outbox_event(db, 'product', product_id, 'product.stock_changed',
+                         {'id': product_id, 'stock': stock})
     await db.commit()
 
-    created_order = await _load_order_with_items(db, order.id)
+    created_order = await _load_order_with_items(db, order_id)
     if not created_order:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -109,37 +292,356 @@ async def checkout_order(
     return created_order
 
 
-@router.get('/', response_model=OrderList)
+def _encode_cursor(created_at: datetime, order_id: int) -> str:
+    """Кодирует позицию последнего заказа страницы в непрозрачный курсор."""
+    raw = json.dumps([created_at.isoformat(), order_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor'
+        )
+
+
+@router.get('/', response_model=OrderList | OrderSummaryList)
 async def list_orders(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_async_db),
+    cursor: str | None = Query(
+        None, description='Курсор из next_cursor предыдущей страницы'
+    ),
+    view: Literal['full', 'summary'] = Query(
+        'full', description='summary — только заголовки и число позиций'
+    ),
+    db: AsyncSession = Depends(get_async_db, scope='function'),
     current_user: UserModel = Depends(get_current_user),
 ):
     """
-    Возвращает заказы текущего пользователя с простой пагинацией.
+    Возвращает заказы текущего пользователя.
+
+    Без cursor работает постраничная пагинация с общим количеством,
+    с cursor — keyset-пагинация по (created_at, id) без подсчёта и OFFSET.
     """
-    total = await db.scalar(
-        select(func.count(OrderModel.id)).where(OrderModel.user_id == current_user.id)
+    conditions = [OrderModel.user_id == current_user.id]
+    total = None
+    offset = 0
+    if cursor:
+        conditions.append(
+            tuple_(OrderModel.created_at, OrderModel.id)
+            < tuple_(*_decode_cursor(cursor))
+        )
+        page = None
+    else:
+        total = await db.scalar(
+            select(func.count(OrderModel.id)).where(*conditions)
+        ) or 0
+        offset = (page - 1) * page_size
+
+    if view == 'summary':
+        items_count = (
+            select(func.count(OrderItemModel.id))
+            .where(OrderItemModel.order_id == OrderModel.id,
+                   OrderItemModel.created_at == OrderModel.created_at)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            select(
+                OrderModel.id,
+                OrderModel.user_id,
+                OrderModel.status,
+                OrderModel.version,
+                OrderModel.total_amount,
+                OrderModel.created_at,
+                OrderModel.updated_at,
+                items_count.label('items_count'),
+            )
+            .where(*conditions)
+            .order_by(OrderModel.created_at.desc(), OrderModel.id.desc())
+            .offset(offset)
+            .limit(page_size + 1)
+        )
+    else:
+        result = await db.scalars(
+            select(OrderModel)
+            .options(selectinload(OrderModel.items).selectinload(OrderItemModel.product))
+            .where(*conditions)
+            .order_by(OrderModel.created_at.desc(), OrderModel.id.desc())
+            .offset(offset)
+            .limit(page_size + 1)
+        )
+    orders = result.all()
+
+    next_cursor = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        next_cursor = _encode_cursor(orders[-1].created_at, orders[-1].id)
+
+    list_schema = OrderSummaryList if view == 'summary' else OrderList
+    return list_schema(
+        items=[
+            OrderSummary.model_validate(order) if view == 'summary' else order
+            for order in orders
+        ],
+        total=total,
+        page=page,
+        page_size=page_size,
+        next_cursor=next_cursor,
     )
-    result = await db.scalars(
-        select(OrderModel)
-        .options(selectinload(OrderModel.items).selectinload(OrderItemModel.product))
-        .where(OrderModel.user_id == current_user.id)
-        .order_by(OrderModel.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
+
+@router.get('/seller', response_model=SellerOrderFeed)
+async def list_seller_orders(
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: int | None = Query(
+        None, description='Курсор из next_cursor предыдущей страницы'
+    ),
+    order_status: str | None = Query(
+        None, alias='status', description='Фильтр по статусу заказа'
+    ),
+    date_from: datetime | None = Query(
+        None, description='Заказы, созданные не раньше'
+    ),
+    date_to: datetime | None = Query(
+        None, description='Заказы, созданные раньше'
+    ),
+    db: AsyncSession = Depends(get_async_db, scope='function'),
+    current_user: UserModel = Depends(get_current_seller),
+):
+    """
+    Возвращает позиции заказов с товарами текущего продавца.
+
+    Лента идёт по индексу (seller_id, id DESC) на order_items, от новых
+    позиций к старым, с keyset-пагинацией по id позиции.
+    """
+    conditions = [OrderItemModel.seller_id == current_user.id]
+    if cursor is not None:
+        conditions.append(OrderItemModel.id < cursor)
+    if order_status is not None:
+        conditions.append(OrderModel.status == order_status)
+    # Фильтр по ключу секционирования order_items отсекает лишние секции.
+    if date_from is not None:
+        conditions.append(OrderItemModel.created_at >= date_from)
+    if date_to is not None:
+        conditions.append(OrderItemModel.created_at < date_to)
+
+    result = await db.execute(
+        select(
+            OrderItemModel.id,
+            OrderItemModel.order_id,
+            OrderItemModel.product_id,
+            OrderItemModel.quantity,
+            OrderItemModel.unit_price,
+            OrderItemModel.total_price,
+            OrderModel.status.label('order_status'),
+            OrderModel.created_at.label('ordered_at'),
+            OrderModel.user_id.label('buyer_id'),
+        )
+        .join(OrderModel, and_(OrderModel.id == OrderItemModel.order_id,
+                               OrderModel.created_at
+                               == OrderItemModel.created_at))
+        .where(*conditions)
+        .order_by(OrderItemModel.id.desc())
+        .limit(page_size + 1)
     )
-    orders = result.all()
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = rows[-1].id
+
+    return SellerOrderFeed(
+        items=[SellerOrderItem.model_validate(row) for row in rows],
+        page_size=page_size,
+        next_cursor=next_cursor,
+    )
+
+
+async def _check_status_permission(
+        db: AsyncSession, order_id: int, owner_id: int, current_status: str,
+        new_status: str, current_user: UserModel,
+) -> None:
+    """Проверяет, может ли пользователь перевести заказ в новый статус.
+
+    Админ меняет любой статус, покупатель может отменить свой заказ до
+    оплаты, продавец — отгрузить и доставить заказ со своими товарами.
+    """
+    if current_user.role == 'admin':
+        return
+    if (current_user.id == owner_id and new_status == 'cancelled'
+            and current_status == 'pending'):
+        return
+    if current_user.role == 'seller' and new_status in SELLER_ORDER_STATUSES:
+        has_items = await db.scalar(
+            select(
+                exists().where(OrderItemModel.order_id == order_id,
+                               OrderItemModel.seller_id == current_user.id)
+            )
+        )
+        if has_items:
+            return
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail='You cannot change the status of this order'
+    )
+
+
+async def _cancel_order_effects(db: AsyncSession, order_id: int) -> None:
+    """Возвращает остатки и убирает заказ из сводки продаж.
+
+    Оба изменения — по одному UPDATE над всеми позициями заказа.
+    """
+    restocked = await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == OrderItemModel.product_id,
+               OrderItemModel.order_id == order_id)
+        .values(stock=ProductModel.stock + OrderItemModel.quantity)
+        .returning(ProductModel.id, ProductModel.stock)
+        .execution_options(synchronize_session=False)
+    )
+    for product_id, stock in restocked.tuples():
+        add_outbox_event(db, 'product', product_id, 'product.stock_changed',
+                         {'id': product_id, 'stock': stock})
+    await db.execute(
+        update(DailySalesModel)
+        .where(
+            OrderItemModel.order_id == order_id,
+            OrderModel.id == order_id,
+            OrderItemModel.created_at == OrderModel.created_at,
+            DailySalesModel.day == cast(
+                func.timezone('UTC', OrderModel.created_at), Date
+            ),
+            DailySalesModel.seller_id == OrderItemModel.seller_id,
+            DailySalesModel.product_id == OrderItemModel.product_id,
+        )
+        .values(
+            order_lines=DailySalesModel.order_lines - 1,
+            units_sold=DailySalesModel.units_sold - OrderItemModel.quantity,
+            revenue=DailySalesModel.revenue - OrderItemModel.total_price,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+@router.patch('/{order_id}/status', response_model=OrderSchema)
+async def update_order_status(
+    order_id: int,
+    payload: OrderStatusUpdate,
+    db: AsyncSession = Depends(get_async_db, scope='function'),
+    current_user: UserModel = Depends(get_current_user),
+):
+    """
+    Переводит заказ в новый статус с оптимистичной блокировкой.
+
+    Изменение применяется через UPDATE ... WHERE version = :version,
+    поэтому параллельные правки не ждут друг друга и не затирают
+    друг друга: проигравший получает 409 и перечитывает заказ.
+    """
+    order = (await db.execute(
+        select(OrderModel.user_id, OrderModel.status, OrderModel.version)
+        .where(OrderModel.id == order_id)
+    )).first()
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Order not found')
+
+    await _check_status_permission(db, order_id, order.user_id, order.status,
+                                   payload.status, current_user)
+    if order.version != payload.version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='Order was modified, reload it and try again'
+        )
+    if payload.status not in ORDER_STATUS_TRANSITIONS[order.status]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Cannot change order status from {order.status} '
+                   f'to {payload.status}'
+        )
 
-    return OrderList(
-        items=orders, total=total or 0, page=page, page_size=page_size
+    updated = await db.scalar(
+        update(OrderModel)
+        .where(OrderModel.id == order_id,
+               OrderModel.version == payload.version)
+        .values(status=payload.status, version=OrderModel.version + 1)
+        .returning(OrderModel.id)
+        .execution_options(synchronize_session=False)
     )
+    if updated is None:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='Order was modified, reload it and try again'
+        )
+    if payload.status == 'cancelled':
+        await _cancel_order_effects(db, order_id)
+    await notify_order_status(db, order_id, order.user_id, payload.status,
+                              payload.version + 1)
+    add_outbox_event(db, 'order', order_id, 'order.status_changed', {
+        'id': order_id,
+        'user_id': order.user_id,
+        'status': payload.status,
+        'previous_status': order.status,
+        'version': payload.version + 1,
+    })
+    await db.commit()
+
+    return await _load_order_with_items(db, order_id)
+
+
+@router.websocket('/ws')
+async def order_status_updates(
+    websocket: WebSocket,
+    token: str = Query(..., description='Access-токен пользователя'),
+    order_id: int | None = Query(None, description='Только этот заказ'),
+):
+    """
+    Присылает изменения статусов заказов пользователя по WebSocket.
+
+    Заменяет периодический опрос GET /orders/{order_id}: клиент держит
+    одно простаивающее соединение, а события приходят через
+    LISTEN/NOTIFY из любого воркера.
+    """
+    async with async_session_maker() as db:
+        try:
+            user = await get_user_by_token(token, db)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        user_id = user.id
+    await websocket.accept()
+
+    async def forward_events(queue: asyncio.Queue) -> None:
+        while True:
+            event = await queue.get()
+            if order_id is None or event['order_id'] == order_id:
+                await websocket.send_json(event)
+
+    async def wait_disconnect() -> None:
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+
+    async with order_status_broker.subscribe(user_id) as queue:
+        tasks = [asyncio.create_task(forward_events(queue)),
+                 asyncio.create_task(wait_disconnect())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
 
 @router.get('/{order_id}', response_model=OrderSchema)
 async def get_order(
     order_id: int,
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_async_db, scope='function'),
     current_user: UserModel = Depends(get_current_user),
 ):
     """
@@ -1,17 +1,25 @@
 from fastapi import APIRouter, Depends, status, Query, UploadFile, File, Form, HTTPException
 
 from app.auth import get_current_seller
-from app.db_depends import get_product_service, get_review_service
+from app.db_depends import (
+    get_product_read_service,
+    get_product_service,
+    get_review_read_service,
+)
 from app.models import User as UserModel
+from app.query_limits import statement_timeout
 from app.schemas import Product as ProductSchema
 from app.schemas import ProductCreate, ProductList
 from app.schemas import Review as ReviewSchema
 from app.services.products_service import ProductsService
 from app.services.reviews_service import ReviewsService
 
+STATEMENT_TIMEOUT_MS = 3000
+
 router = APIRouter(
     prefix='/products',
     tags=['products'],
+    dependencies=[Depends(statement_timeout(STATEMENT_TIMEOUT_MS))],
 )
 
 @router.get('/', response_model=ProductList)
@@ -28,7 +36,7 @@ async def get_all_products(
         seller_id: int | None = Query(None, description="ID продавца"),
         search_prod: str | None = Query(None, min_length=1,
                                         description="Поиск по названию товара"),
-        service: ProductsService = Depends(get_product_service)
+        service: ProductsService = Depends(get_product_read_service)
 ) -> ProductList:
     """Возвращает список всех товаров с фильтрацией."""
     return await service.get_all_products(
@@ -60,7 +68,7 @@ async def create_product(
 @router.get('/category/{category_id}', response_model=list[ProductSchema])
 async def get_products_by_category(
         category_id: int,
-        service: ProductsService = Depends(get_product_service)
+        service: ProductsService = Depends(get_product_read_service)
 ) -> list[ProductSchema]:
     """Возвращает список товаров в указанной категории по её ID."""
     return await service.get_products_by_category(category_id)
@@ -73,7 +81,7 @@ async def get_products_by_category(
 )
 async def get_product(
         product_id: int,
-        service: ProductsService = Depends(get_product_service)
+        service: ProductsService = Depends(get_product_read_service)
 ) -> ProductSchema:
     """Возвращает детальную информацию о товаре по его ID."""
     return await service.get_product_by_id(product_id)
@@ -82,7 +90,7 @@ async def get_product(
 @router.get('/{product_id}/reviews', response_model=list[ReviewSchema])
 async def get_review(
         product_id: int,
-        service: ReviewsService = Depends(get_review_service)
+        service: ReviewsService = Depends(get_review_read_service)
 ) -> list[ReviewSchema]:
     """Возвращает детальную информацию об отзыве по его ID."""
     return await service.get_reviews_by_product(product_id)
@@ -1,21 +1,31 @@
 from fastapi import APIRouter, Depends
 
-from app.auth import get_current_buyer, get_current_user
-from app.db_depends import get_review_service
+from app.auth import get_current_admin, get_current_buyer, get_current_user
+from app.db_depends import get_review_read_service, get_review_service
 from app.models import User as UserModel
+from app.query_limits import statement_timeout
 from app.schemas import Review as ReviewSchema
-from app.schemas import ReviewCreate
+from app.schemas import (
+    ReviewBatchDelete,
+    ReviewBatchDeleteResult,
+    ReviewCreate,
+)
 from app.services.reviews_service import ReviewsService
 
+STATEMENT_TIMEOUT_MS = 3000
+# Пакетное удаление пересчитывает рейтинг многих товаров.
+BATCH_DELETE_STATEMENT_TIMEOUT_MS = 30_000
+
 router = APIRouter(
     prefix='/reviews',
     tags=['reviews'],
+    dependencies=[Depends(statement_timeout(STATEMENT_TIMEOUT_MS))],
 )
 
 
 @router.get('/', response_model=list[ReviewSchema])
 async def get_all_reviews(
-        service: ReviewsService = Depends(get_review_service)
+        service: ReviewsService = Depends(get_review_read_service)
 ) -> list[ReviewSchema]:
     """Возвращает список всех отзывов."""
     return await service.get_all_reviews()
@@ -40,3 +50,22 @@ async def delete_review(
     """Удаляет отзыв (только владелец или админ)."""
     await service.delete_review(review_id, current_user.id, current_user.role)
     return {'message': 'Review deleted'}
+
+
+# Зависимости маршрута выполняются после роутерных, поэтому этот
+# statement_timeout заменяет общий.
+@router.post(
+    '/batch-delete', response_model=ReviewBatchDeleteResult,
+    dependencies=[Depends(
+        statement_timeout(BATCH_DELETE_STATEMENT_TIMEOUT_MS)
+    )],
+)
+async def delete_reviews_batch(
+        payload: ReviewBatchDelete,
+        service: ReviewsService = Depends(get_review_service),
+        current_user: UserModel = Depends(get_current_admin)
+) -> ReviewBatchDeleteResult:
+    """Пакетно удаляет отзывы по id или автору (только админ)."""
+    return await service.delete_reviews_batch(
+        payload.review_ids, payload.user_id
+    )
@@ -1,20 +1,29 @@
 from typing import Any
 
 import jwt
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth import (
     create_access_token,
     create_refresh_token,
-    hash_password,
-    verify_password,
+    get_active_principal,
+    hash_password_async,
+    verify_and_update_password_async,
 )
 from app.config import ALGORITHM, SECRET_KEY
 from app.db_depends import get_async_db
 from app.models.users import User as UserModel
+from app.rate_limit import login_rate_limiter
+from app.refresh_tokens import (
+    new_token_id,
+    revoked_families,
+    rotate_family,
+    start_family,
+)
+from app.routers.carts import merge_guest_cart
 from app.schemas import RefreshTokenRequest, UserCreate
 from app.schemas import User as UserSchema
 
@@ -24,8 +33,14 @@ router = APIRouter(prefix='/users', tags=['users'])
 @router.post("/", response_model=UserSchema,
              status_code=status.HTTP_201_CREATED)
 async def create_user(user: UserCreate,
-                      db: AsyncSession = Depends(get_async_db)) -> UserSchema:
-    """Регистрирует нового пользователя с ролью 'buyer' или 'seller'."""
+                      db: AsyncSession = Depends(
+                          get_async_db, scope='function')) -> UserSchema:
+    """Регистрирует нового пользователя с ролью 'buyer' или 'seller'.
+
+    Пароль хешируется до первого запроса, чтобы сессия не держала
+    соединение с БД во время работы bcrypt.
+    """
+    hashed_password = await hash_password_async(user.password)
     result = await db.scalars(select(UserModel)
                               .where(UserModel.email == user.email))
     if result.first():
@@ -34,7 +49,7 @@ async def create_user(user: UserCreate,
 
     db_user = UserModel(
         email=user.email,
-        hashed_password=hash_password(user.password),
+        hashed_password=hashed_password,
         role=user.role
     )
     db.add(db_user)
@@ -43,74 +58,114 @@ async def create_user(user: UserCreate,
 
 
 @router.post('/token')
-async def login(form_data: OAuth2PasswordRequestForm = Depends(),
-                db: AsyncSession = Depends(get_async_db)) -> dict[str, str]:
-    """Аутентифицирует пользователя и возвращает access и refresh_token."""
+async def login(request: Request,
+                form_data: OAuth2PasswordRequestForm = Depends(),
+                guest_cart_token: str | None = Header(
+                    None, alias='X-Guest-Cart'),
+                db: AsyncSession = Depends(
+                    get_async_db, scope='function')) -> dict[str, str]:
+    """Аутентифицирует пользователя и возвращает access и refresh_token.
+
+    Если передан заголовок X-Guest-Cart, гостевая корзина переносится
+    в корзину пользователя. Перед проверкой пароля сессия закрывается,
+    чтобы соединение с БД вернулось в пул на время хеширования; хеш
+    с устаревшими параметрами при этом пересчитывается. Частота
+    попыток ограничена по IP и логину (429 с Retry-After); за обратным
+    прокси IP клиента берётся из X-Forwarded-For, только если прокси
+    указан в TRUSTED_PROXIES.
+    """
+    client_ip = request.client.host if request.client else None
+    await login_rate_limiter.check(client_ip, form_data.username)
     result = await db.scalars(
         select(UserModel).where(UserModel.email == form_data.username,
                                 UserModel.is_active))
     user = result.first()
-    if not user or not verify_password(form_data.password,
-                                       user.hashed_password):
+    await db.close()
+    verified, new_hash = (
+        await verify_and_update_password_async(form_data.password,
+                                               user.hashed_password)
+        if user else (False, None)
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Incorrect email or password',
             headers={'WWW-Authenticate': "Bearer"},
         )
-    access_token = create_access_token(
-        data={'sub': user.email, 'role': user.role, 'id': user.id}
-    )
-    refresh_token = create_refresh_token(
-        data={'sub': user.email, 'role': user.role, 'id': user.id}
-    )
-    return {'access_token': access_token, 'refresh_token': refresh_token,
-            'token_type': 'bearer'}
+    if new_hash:
+        # Хеш устарел (другой алгоритм или меньшая стоимость).
+        await db.execute(
+            update(UserModel)
+            .where(UserModel.id == user.id,
+                   UserModel.hashed_password == user.hashed_password)
+            .values(hashed_password=new_hash)
+        )
+    family_id, jti = new_token_id(), new_token_id()
+    start_family(db, family_id, user.id, jti)
+    if guest_cart_token:
+        await merge_guest_cart(db, user.id, guest_cart_token)
+    await db.commit()
+    return _issue_tokens(user.email, user.role, user.id, family_id, jti)
 
 
-@router.post("/refresh-token")
-async def refresh_token(
-        body: RefreshTokenRequest,
-        db: AsyncSession = Depends(get_async_db),
-) -> dict[str, str]:
-    """Обновляет refresh-токен, принимая старый refresh-токен."""
+def _issue_tokens(email: str, role: str, user_id: int,
+                  family_id: str, jti: str) -> dict[str, str]:
+    """Выпускает access и refresh-токен одного семейства."""
+    data = {'sub': email, 'role': role, 'id': user_id, 'fam': family_id}
+    return {
+        'access_token': create_access_token(data=data),
+        'refresh_token': create_refresh_token(data={**data, 'jti': jti}),
+        'token_type': 'bearer',
+    }
+
+
+async def _rotate_refresh_token(db: AsyncSession,
+                                token: str) -> dict[str, str]:
+    """Проверяет refresh-токен и заменяет его следующим в семействе.
+
+    Отзыв проверяется по множеству в памяти, пользователь — по кэшу,
+    так что в обычном случае к базе идёт один UPDATE ротации.
+    Повторно предъявленный токен отзывает всё семейство.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail='Could not validate refresh token',
         headers={'WWW-Authenticate': 'Bearer'},
     )
-
-    old_refresh_token = body.refresh_token
-
-    try:
-        payload = jwt.decode(old_refresh_token,
-                             SECRET_KEY, algorithms=[ALGORITHM])
-        email: str | None = payload.get('sub')
-        token_type: str | None = payload.get('token_type')
-
-        if email is None or token_type != 'refresh':
-            raise credentials_exception
-
-    except jwt.ExpiredSignatureError:
+    payload = decode_token(token)
+    family_id = payload.get('fam')
+    jti = payload.get('jti')
+    user_id = payload.get('id')
+    if (payload.get('token_type') != 'refresh'
+            or not isinstance(family_id, str)
+            or not isinstance(jti, str)
+            or not isinstance(user_id, int)):
         raise credentials_exception
-    except jwt.PyJWTError:
+    if family_id in revoked_families:
         raise credentials_exception
 
-    result = await db.scalars(
-        select(UserModel).where(
-            UserModel.email == email,
-            UserModel.is_active
-        )
-    )
-    user = result.first()
-    if user is None:
+    principal = await get_active_principal(db, user_id)
+    if principal is None:
         raise credentials_exception
+    new_jti = new_token_id()
+    if not await rotate_family(db, family_id, user_id, jti, new_jti):
+        raise credentials_exception
+    return _issue_tokens(principal.email, principal.role, principal.id,
+                         family_id, new_jti)
 
-    new_refresh_token = create_refresh_token(
-        data={'sub': user.email, 'role': user.role, 'id': user.id}
-    )
 
+@router.post("/refresh-token")
+async def refresh_token(
+        body: RefreshTokenRequest,
+        db: AsyncSession = Depends(get_async_db, scope='function'),
+) -> dict[str, str]:
+    """Обновляет refresh-токен, принимая старый refresh-токен.
+
+    Старый токен после этого недействителен.
+    """
+    tokens = await _rotate_refresh_token(db, body.refresh_token)
     return {
-        'refresh_token': new_refresh_token,
+        'refresh_token': tokens['refresh_token'],
         'token_type': 'bearer',
     }
 
@@ -132,24 +187,10 @@ def decode_token(token: str) -> dict[str, Any]:
 @router.post('/refresh')
 async def refresh_access_token(
         refresh_token: str,
-        db: AsyncSession = Depends(get_async_db)
+        db: AsyncSession = Depends(get_async_db, scope='function')
 ) -> dict[str, str]:
-    """Обновляет токен."""
-    payload = decode_token(refresh_token)
-    if payload['token_type'] != 'refresh':
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail='Invalid token type')
-    user_id = payload.get('id')
-    user = await db.scalar(
-        select(UserModel).where(UserModel.id == user_id,
-                                UserModel.is_active)
-    )
-    if not user:
-        raise HTTPException(status_code=401, detail='User not found')
-    new_access_token = create_access_token(
-        data={'sub': user.email, 'role': user.role, 'id': user.id}
-    )
-    return {
-        'access_token': new_access_token,
-        'token_type': 'bearer',
-    }
+    """Обновляет токен.
+
+    Refresh-токен ротируется: в ответе новый, старый больше не принимается.
+    """
+    return await _rotate_refresh_token(db, refresh_token)
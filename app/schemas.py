@@ -1,9 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
-from typing import Annotated
+from typing import Annotated, Literal
 from fastapi import Form
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, model_validator
 
 
 class CategoryCreate(BaseModel):
@@ -176,10 +176,40 @@ class Review(ReviewCreate):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ReviewBatchDelete(BaseModel):
+    """Модель пакетного удаления отзывов (модерация)."""
+
+    review_ids: Annotated[list[int], Field(
+        default_factory=list, description='ID отзывов для удаления'
+    )]
+    user_id: Annotated[int | None, Field(
+        None, description='Удалить все отзывы этого пользователя'
+    )]
+
+    @model_validator(mode='after')
+    def check_target(self) -> 'ReviewBatchDelete':
+        if not self.review_ids and self.user_id is None:
+            raise ValueError('Укажите review_ids или user_id')
+        return self
+
+
+class ReviewBatchDeleteResult(BaseModel):
+    """Результат пакетного удаления отзывов."""
+
+    deleted: Annotated[int, Field(
+        ..., ge=0, description='Количество удалённых отзывов'
+    )]
+    product_ids: Annotated[list[int], Field(
+        default_factory=list,
+        description='ID товаров, у которых пересчитан рейтинг'
+    )]
+
+
 class CartItemBase(BaseModel):
     """Базовая модель для корзины товаров."""
     product_id: Annotated[int, Field(..., description='ID товара')]
-    quantity: Annotated[int, Field(..., description='Количество товара')]
+    quantity: Annotated[int, Field(..., ge=1,
+                                   description='Количество товара')]
 
 
 class CartItemCreate(CartItemBase):
@@ -192,6 +222,33 @@ class CartItemUpdate(BaseModel):
                                    description='Новое количество товара')]
 
 
+class CartBatchOperation(BaseModel):
+    """Одна операция пакетного изменения корзины."""
+    product_id: Annotated[int, Field(..., description='ID товара')]
+    quantity: Annotated[int, Field(
+        0, ge=0, description='Количество товара (не нужно для remove)'
+    )]
+    action: Annotated[Literal['set', 'increment', 'remove'], Field(
+        'increment',
+        description='set — задать количество, increment — добавить, '
+                    'remove — удалить позицию'
+    )]
+
+    @model_validator(mode='after')
+    def check_quantity(self) -> 'CartBatchOperation':
+        if self.action != 'remove' and self.quantity < 1:
+            raise ValueError('quantity must be >= 1 for set and increment')
+        return self
+
+
+class CartBatchUpdate(BaseModel):
+    """Модель пакетного изменения корзины."""
+    items: Annotated[list[CartBatchOperation], Field(
+        ..., min_length=1, max_length=500,
+        description='Список операций над позициями корзины'
+    )]
+
+
 class CartItem(BaseModel):
     """Товар в корзине с данными продукта."""
     id: Annotated[int, Field(..., description='ID позиции корзины')]
@@ -209,13 +266,45 @@ class Cart(BaseModel):
     total_quantity: Annotated[int, Field(
         ..., ge=0, description='Общее количество товаров'
     )]
-    total_price: Annotated[int, Field(
+    total_price: Annotated[Decimal, Field(
         ..., ge=0, description='Общая стоимость товаров'
     )]
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class CartSummary(BaseModel):
+    """Краткая сводка по корзине без списка позиций."""
+    total_quantity: Annotated[int, Field(
+        ..., ge=0, description='Общее количество товаров'
+    )]
+    total_price: Annotated[Decimal, Field(
+        ..., ge=0, description='Общая стоимость товаров'
+    )]
+
+
+class GuestCartItem(BaseModel):
+    """Позиция гостевой корзины с данными продукта."""
+    quantity: Annotated[int, Field(..., ge=1, description='Количество товара')]
+    product: Annotated[Product, Field(..., description='Информация о товаре')]
+
+
+class GuestCart(BaseModel):
+    """Гостевая корзина, хранящаяся на клиенте в подписанном токене."""
+    token: Annotated[str, Field(
+        ..., description='Новый токен корзины для заголовка X-Guest-Cart'
+    )]
+    items: Annotated[list[GuestCartItem], Field(
+        default_factory=list, description='Содержимое корзины.'
+    )]
+    total_quantity: Annotated[int, Field(
+        ..., ge=0, description='Общее количество товаров'
+    )]
+    total_price: Annotated[Decimal, Field(
+        ..., ge=0, description='Общая стоимость товаров'
+    )]
+
+
 class OrderItem(BaseModel):
     id: int = Field(..., description='ID позиции заказа')
     product_id: int = Field(..., description='ID товара')
@@ -235,6 +324,7 @@ class Order(BaseModel):
     id: int = Field(..., description='ID заказа')
     user_id: int = Field(..., description='ID пользователя')
     status: str = Field(..., description='Текущий статус заказа')
+    version: int = Field(..., ge=1, description='Версия заказа')
     total_amount: Decimal = Field(..., ge=0, description='Общая стоимость')
     created_at: datetime = Field(..., description='Когда заказ был создан')
     updated_at: datetime = Field(
@@ -247,10 +337,107 @@ class Order(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class OrderStatusUpdate(BaseModel):
+    status: Literal['paid', 'shipped', 'delivered', 'cancelled'] = Field(
+        ..., description='Новый статус заказа'
+    )
+    version: int = Field(
+        ..., ge=1, description='Версия заказа, которую видел клиент'
+    )
+
+
 class OrderList(BaseModel):
     items: list[Order] = Field(..., description='Заказы на текущей странице')
-    total: int = Field(ge=0, description='Общее количество заказов')
-    page: int = Field(ge=1, description='Текущая страница')
+    total: int | None = Field(
+        None, ge=0,
+        description='Общее количество заказов (не считается при cursor)'
+    )
+    page: int | None = Field(
+        None, ge=1, description='Текущая страница (нет при cursor)'
+    )
     page_size: int = Field(ge=1, description='Размер страницы')
+    next_cursor: str | None = Field(
+        None, description='Курсор следующей страницы, если она есть'
+    )
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SellerOrderItem(BaseModel):
+    id: int = Field(..., description='ID позиции заказа')
+    order_id: int = Field(..., description='ID заказа')
+    product_id: int = Field(..., description='ID товара')
+    quantity: int = Field(..., ge=1, description='Количество')
+    unit_price: Decimal = Field(
+        ..., ge=0, description='Цена за единицу на момент покупки'
+    )
+    total_price: Decimal = Field(..., ge=0, description='Сумма по позиции')
+    order_status: str = Field(..., description='Статус заказа')
+    ordered_at: datetime = Field(..., description='Когда заказ был создан')
+    buyer_id: int = Field(..., description='ID покупателя')
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SellerOrderFeed(BaseModel):
+    items: list[SellerOrderItem] = Field(
+        ..., description='Позиции заказов с товарами продавца'
+    )
+    page_size: int = Field(ge=1, description='Размер страницы')
+    next_cursor: int | None = Field(
+        None, description='Курсор следующей страницы, если она есть'
+    )
+
+
+class SalesTotals(BaseModel):
+    order_lines: int = Field(
+        ..., ge=0, description='Количество позиций заказов'
+    )
+    units_sold: int = Field(..., ge=0, description='Продано единиц')
+    revenue: Decimal = Field(..., ge=0, description='Выручка')
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class DailySalesReport(SalesTotals):
+    day: date = Field(..., description='День (UTC)')
+
+
+class ProductSalesReport(SalesTotals):
+    product_id: int = Field(..., description='ID товара')
+
+
+class SellerSalesReport(SalesTotals):
+    seller_id: int = Field(..., description='ID продавца')
+
+
+class OrderSummary(BaseModel):
+    id: int = Field(..., description='ID заказа')
+    user_id: int = Field(..., description='ID пользователя')
+    status: str = Field(..., description='Текущий статус заказа')
+    version: int = Field(..., ge=1, description='Версия заказа')
+    total_amount: Decimal = Field(..., ge=0, description='Общая стоимость')
+    created_at: datetime = Field(..., description='Когда заказ был создан')
+    updated_at: datetime = Field(
+        ..., description='Когда последний раз обновлялся'
+    )
+    items_count: int = Field(..., ge=0, description='Количество позиций')
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class OrderSummaryList(BaseModel):
+    items: list[OrderSummary] = Field(
+        ..., description='Заголовки заказов на текущей странице'
+    )
+    total: int | None = Field(
+        None, ge=0,
+        description='Общее количество заказов (не считается при cursor)'
+    )
+    page: int | None = Field(
+        None, ge=1, description='Текущая страница (нет при cursor)'
+    )
+    page_size: int = Field(ge=1, description='Размер страницы')
+    next_cursor: str | None = Field(
+        None, description='Курсор следующей страницы, если она есть'
+    )
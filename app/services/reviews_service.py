@@ -4,7 +4,7 @@ from fastapi import HTTPException, status
 
 from app.repositories.products_repository import ProductsRepository
 from app.repositories.reviews_repository import ReviewsRepository
-from app.schemas import Review
+from app.schemas import Review, ReviewBatchDeleteResult
 from app.services.base import BaseService
 
 
@@ -48,6 +48,17 @@ class ReviewsService(BaseService):
         await self.repo.soft_delete(review_id)
         await self._update_rating(product_id)
 
+    async def delete_reviews_batch(
+            self, review_ids: list[int], user_id: int | None
+    ) -> ReviewBatchDeleteResult:
+        """Мягко удалить пачку отзывов и обновить рейтинги товаров."""
+        deleted, product_ids = await self.repo.soft_delete_batch(
+            review_ids, user_id
+        )
+        return ReviewBatchDeleteResult(
+            deleted=deleted, product_ids=product_ids
+        )
+
     async def _validate_product_exists(self, product_id: int) -> None:
         """Проверить существование товара."""
         product = await self.product_repo.get_by_id(product_id)
@@ -0,0 +1,136 @@
+"""Типизированные настройки приложения.
+
+Значения берутся из профиля окружения APP_ENV (development,
+production, test) и переопределяются переменными окружения с именем
+поля в верхнем регистре, например DB_POOL_SIZE=20.
+"""
+import importlib.util
+import os
+import types
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Union, get_args, get_origin, get_type_hints
+
+from dotenv import load_dotenv
+
+TRUE_VALUES = {'1', 'true', 'yes', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'off'}
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Настройки одного процесса; читаются один раз при импорте."""
+
+    app_env: str = 'development'
+    database_url: str | None = None
+    # Реплика для чтения каталога; без неё всё читается с primary.
+    database_replica_url: str | None = None
+    # Сколько секунд после записи пользователь читает с primary.
+    read_your_writes_seconds: float = 5
+    secret_key: str | None = None
+
+    # Пул соединений и драйвер asyncpg.
+    db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    # Через сколько секунд пересоздавать соединение; -1 — никогда.
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = False
+    # Размер кэша подготовленных запросов на соединение; 0 — без кэша.
+    db_statement_cache_size: int = 100
+    # statement_timeout сессии в миллисекундах; 0 — настройка сервера.
+    db_statement_timeout_ms: int = 0
+    # DATABASE_URL указывает на PgBouncer в режиме pool_mode=transaction.
+    db_pgbouncer: bool = False
+    # Прямое подключение к Postgres для LISTEN; обязательно при PgBouncer.
+    database_direct_url: str | None = None
+
+    # Хеширование паролей.
+    password_hash_workers: int = os.cpu_count() or 1
+    password_hash_scheme: str = 'bcrypt'
+    bcrypt_rounds: int = 12
+    argon2_time_cost: int = 3
+    argon2_memory_cost: int = 64 * 1024
+
+    # Ограничение попыток входа: memory или postgres.
+    login_rate_limit_backend: str = 'memory'
+    # Адреса и подсети обратных прокси через запятую: только от них
+    # берётся адрес клиента из X-Forwarded-For.
+    trusted_proxies: str = ''
+
+    max_image_size: int = 2 * 1024 * 1024
+    # Относительный путь считается от корня проекта.
+    outbox_file: Path = Path('var') / 'outbox.ndjson'
+
+    def __post_init__(self) -> None:
+        if self.db_pgbouncer and not self.database_direct_url:
+            raise ValueError(
+                'DB_PGBOUNCER requires DATABASE_DIRECT_URL: LISTEN/NOTIFY '
+                'does not work through transaction pooling'
+            )
+        if (self.password_hash_scheme == 'argon2'
+                and importlib.util.find_spec('argon2') is None):
+            raise ValueError(
+                'PASSWORD_HASH_SCHEME=argon2 requires argon2-cffi: '
+                'pip install argon2-cffi'
+            )
+
+
+PROFILES: dict[str, dict[str, Any]] = {
+    'development': {
+        'db_echo': True,
+    },
+    'production': {
+        'db_pool_size': 10,
+        'db_max_overflow': 20,
+        'db_pool_timeout': 10,
+        'db_pool_recycle': 1800,
+        'db_pool_pre_ping': True,
+        'db_statement_timeout_ms': 30_000,
+    },
+    'test': {
+        'db_pool_size': 2,
+        'db_max_overflow': 0,
+        'db_statement_timeout_ms': 10_000,
+        'bcrypt_rounds': 4,
+    },
+}
+
+
+def _parse(value: str, annotation: Any) -> Any:
+    if get_origin(annotation) in (Union, types.UnionType):
+        annotation = next(arg for arg in get_args(annotation)
+                          if arg is not type(None))
+    if annotation is bool:
+        if value.strip().lower() in TRUE_VALUES:
+            return True
+        if value.strip().lower() in FALSE_VALUES:
+            return False
+        raise ValueError(f'Expected a boolean, got {value!r}')
+    return annotation(value)
+
+
+def load_settings(environ: dict[str, str] | None = None) -> Settings:
+    """Собирает настройки: значения по умолчанию, профиль, окружение."""
+    if environ is None:
+        load_dotenv()
+        environ = dict(os.environ)
+    app_env = environ.get('APP_ENV', Settings.app_env)
+    if app_env not in PROFILES:
+        raise ValueError(f'Unknown APP_ENV: {app_env}')
+
+    values: dict[str, Any] = {'app_env': app_env, **PROFILES[app_env]}
+    hints = get_type_hints(Settings)
+    for field in fields(Settings):
+        raw = environ.get(field.name.upper())
+        if raw is None or field.name == 'app_env':
+            continue
+        try:
+            values[field.name] = _parse(raw, hints[field.name])
+        except ValueError as exc:
+            raise ValueError(f'Invalid {field.name.upper()}: {exc}') from exc
+    return Settings(**values)
+
+
+settings = load_settings()